@@ -92,6 +92,10 @@ def register_commands(app):
     app.cli.add_command(commands.test)
     app.cli.add_command(commands.lint)
 
+    # Register celery_helper.beat commands
+    beat_commands = import_module(__package__ + ".celery_helper.beat.commands")
+    app.cli.add_command(beat_commands.beat)
+
 
 def configure_logger(app):
     """Configure loggers."""
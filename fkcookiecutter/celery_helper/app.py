@@ -4,10 +4,10 @@ import logging
 from importlib import import_module
 from collections import OrderedDict
 
-from celery import Celery
 from celery import platforms
 
 from .conf import CeleryConfig
+from .core.backends import ResultPolicyCelery
 from .hooks.context import TaskContext
 
 __all__ = ["app", 'celery_app']
@@ -15,7 +15,7 @@ __all__ = ["app", 'celery_app']
 beat_cls = "%s.hooks.beat:Beat" % __name__.rsplit(".", 1)[0]
 
 main = CeleryConfig.APP_NAME or __name__
-app = Celery(main=main + '_celery', task_cls=TaskContext)
+app = ResultPolicyCelery(main=main + '_celery', task_cls=TaskContext)
 # app.set_current()
 platforms.C_FORCE_ROOT = True       # celery不能用root用户启动问题
 
@@ -1,7 +1,6 @@
-from flask import Blueprint
-
 from . import models
 from .signals import signals_connect
 
 signals_connect()
-blueprint = Blueprint("beat", __name__)
+
+from .views import blueprint  # noqa: E402
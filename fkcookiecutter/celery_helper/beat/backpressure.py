@@ -0,0 +1,136 @@
+"""Backpressure of beat dispatch: queue depth limits and publish rate limits."""
+import time
+
+from celery.utils.log import get_logger
+
+from ..core.limits import TokenBuckets
+
+logger = get_logger(__name__)
+
+DEFAULT_QUEUE_DEPTH_TTL = 5  # seconds
+
+
+class QueueDepthMonitor:
+    """Cached message counts of the broker queues beat publishes to.
+
+    ``limits`` maps a queue name to the depth at which fires to that queue are skipped, the queue of
+    an entry is the one it resolves to (its ``queue`` option, else the task route, else the default queue).
+
+    Depths of all watched queues are refreshed together, at most once per ``ttl`` seconds: one pipeline of
+    ``LLEN`` on Redis, a passive ``queue_declare`` per queue on other transports. When the broker can not be
+    asked the last known depths are kept, so a broker hiccup never blocks dispatch.
+    """
+
+    def __init__(self, app, limits, ttl=DEFAULT_QUEUE_DEPTH_TTL):
+        self.app = app
+        self.limits = dict(limits)
+        self.ttl = ttl
+
+        self.depths = {}
+        self._watched = set()
+        self._expires_at = 0
+        self._connection = None
+        self._channel = None
+
+    @classmethod
+    def from_conf(cls, app):
+        """Build from celery configuration, return None if no depth limit is set."""
+        limits = app.conf.get('CELERYBEAT_QUEUE_DEPTH_LIMITS')
+        if not limits:
+            return None
+
+        return cls(app, limits, ttl=app.conf.get('CELERYBEAT_QUEUE_DEPTH_TTL', DEFAULT_QUEUE_DEPTH_TTL))
+
+    def over_limit(self, queue):
+        limit = self.limits.get(queue)
+        if limit is None or not queue:
+            return False
+        return self.depth(queue) >= limit
+
+    def depth(self, queue):
+        if queue not in self._watched:
+            self._watched.add(queue)
+            self._expires_at = 0
+
+        if time.monotonic() >= self._expires_at:
+            self.refresh()
+        return self.depths.get(queue, 0)
+
+    def refresh(self):
+        self._expires_at = time.monotonic() + self.ttl
+
+        try:
+            channel = self._get_channel()
+            if self._connection.transport.driver_type == 'redis':
+                depths = self._redis_depths(channel)
+            else:
+                depths = self._declare_depths(channel)
+        except Exception as exc:
+            logger.warning('QueueDepthMonitor: refresh failed, keep the last depths: %r', exc)
+            self.close()
+        else:
+            self.depths.update(depths)
+
+    def _get_channel(self):
+        if self._connection is None:
+            self._connection = self.app.connection_for_read()
+            self._connection.ensure_connection(max_retries=1)
+        if self._channel is None:
+            self._channel = self._connection.channel()
+        return self._channel
+
+    def _redis_depths(self, channel):
+        # Same as `kombu.transport.redis.Channel._size`, but for all queues in one round-trip
+        queues = list(self._watched)
+        steps = channel.priority_steps
+
+        with channel.conn_or_acquire() as client:
+            with client.pipeline() as pipe:
+                for queue in queues:
+                    for priority in steps:
+                        pipe.llen(channel._q_for_pri(queue, priority))
+                sizes = pipe.execute()
+
+        return {
+            queue: sum(size for size in sizes[index * len(steps):(index + 1) * len(steps)] if isinstance(size, int))
+            for index, queue in enumerate(queues)
+        }
+
+    def _declare_depths(self, channel):
+        depths = {}
+        channel_errors = self._connection.channel_errors
+
+        for queue in self._watched:
+            try:
+                depths[queue] = channel.queue_declare(queue=queue, passive=True).message_count
+            except channel_errors:
+                # The queue is not declared yet, AMQP closes the channel on a failed passive declare
+                depths[queue] = 0
+                channel = self._channel = self._connection.channel()
+
+        return depths
+
+    def close(self):
+        connection, self._connection, self._channel = self._connection, None, None
+        if connection is not None:
+            try:
+                connection.release()
+            except Exception:  # pylint: disable=broad-except
+                pass
+
+
+class RateLimiter(TokenBuckets):
+    """Token buckets limiting how fast beat publishes, per periodic task and per queue.
+
+    ``limits`` maps a periodic task name or a queue name to a celery rate (eg: ``'10/m'``),
+    or to ``(rate, capacity)`` to allow bursts of ``capacity`` fires. A fire needs a token
+    from every bucket that applies, see ``core.limits.TokenBuckets``.
+    """
+
+    @classmethod
+    def from_conf(cls, app):
+        """Build from celery configuration, return None if no rate limit is set."""
+        limits = app.conf.get('CELERYBEAT_RATE_LIMITS')
+        if not limits:
+            return None
+        return cls(limits)
@@ -0,0 +1,308 @@
+"""Build periodic tasks from plain payloads, for bulk APIs and imports."""
+from datetime import datetime, timezone
+from itertools import islice
+
+from sqlalchemy import bindparam, delete, insert, select, update
+
+from .models import ClockedSchedule, CrontabSchedule, IntervalSchedule, PeriodicTask, PeriodicTasks, db
+
+SCHEDULE_FIELDS = ('interval', 'crontab', 'solar', 'clocked')
+CRONTAB_FIELDS = ('minute', 'hour', 'day_of_month', 'month_of_year', 'day_of_week')
+
+# Plain columns a payload may set, the schedule is given by one of SCHEDULE_FIELDS
+TASK_FIELDS = (
+    'name', 'task', 'queue', 'exchange', 'routing_key', 'priority',
+    'expire_seconds', 'one_off', 'enabled', 'description',
+)
+JSON_FIELDS = {'args': list, 'kwargs': dict, 'headers': dict}
+DATETIME_FIELDS = ('expires', 'start_time')
+
+# Column values of an imported task that are not given in its record
+IMPORT_DEFAULTS = dict(
+    queue=None, exchange=None, routing_key=None, priority=None, expires=None, expire_seconds=None,
+    one_off=False, enabled=True, start_time=None, description='',
+)
+IMPORT_CHUNK_SIZE = 1000
+
+
+class PayloadError(ValueError):
+    """The payload of a periodic task is invalid."""
+
+
+def naive_utc(value):
+    """Aware datetimes as naive UTC, the form stored in the (timezone-less) beat columns."""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return naive_utc(value)
+    try:
+        return naive_utc(datetime.fromisoformat(value))
+    except (TypeError, ValueError):
+        raise PayloadError(f'Invalid datetime: {value!r}')
+
+
+class ScheduleResolver:
+    """Get or create schedule rows without committing, caching their ids per spec.
+
+    A batch sharing the same crontab or interval therefore hits the database once for it.
+    Ids of rows created since the last ``commit()`` are forgotten by ``rollback()``: callers
+    applying each item in a savepoint call one or the other when the savepoint ends.
+    """
+
+    def __init__(self, session=None):
+        self.session = session or db.session
+        self._cache = {}
+        self._created = {}
+
+    def _get_or_create(self, model, **spec):
+        key = (model, tuple(sorted(spec.items())))
+        schedule_id = self._cache.get(key) or self._created.get(key)
+
+        if schedule_id is None:
+            schedule_id = self.session.scalar(select(model.id).filter_by(**spec).limit(1))
+            if schedule_id is None:
+                # Core insert: no mapper event bumps the change version, the task written with it does
+                result = self.session.execute(insert(model.__table__).values(**spec))
+                schedule_id = self._created[key] = result.inserted_primary_key[0]
+            else:
+                self._cache[key] = schedule_id
+
+        return schedule_id
+
+    def commit(self):
+        """The rows created so far are committed (or their savepoint released), keep their ids."""
+        self._cache.update(self._created)
+        self._created.clear()
+
+    def rollback(self):
+        """The rows created since the last ``commit()`` are rolled back, forget their ids."""
+        self._created.clear()
+
+    def crontab(self, value):
+        if isinstance(value, str):
+            parts = value.split()
+            if len(parts) != 5:
+                raise PayloadError(f'Crontab expression must have 5 fields: {value!r}')
+            # Expression order is "minute hour day_of_month month_of_year day_of_week"
+            value = dict(zip(CRONTAB_FIELDS, parts))
+
+        spec = {field: str(value.get(field, '*')) for field in CRONTAB_FIELDS}
+        if value.get('timezone'):
+            spec['timezone'] = value['timezone']
+        return self._get_or_create(CrontabSchedule, **spec)
+
+    def interval(self, value):
+        try:
+            every, period = int(value['every']), value['period']
+        except (KeyError, TypeError, ValueError):
+            raise PayloadError(f'Interval needs `every` and `period`: {value!r}')
+
+        if period not in dict(IntervalSchedule.PERIOD_CHOICES):
+            raise PayloadError(f'Invalid interval period: {period!r}')
+        return self._get_or_create(IntervalSchedule, every=every, period=period)
+
+    def clocked(self, value):
+        if isinstance(value, dict):
+            value = value.get('clocked_time')
+        return self._get_or_create(ClockedSchedule, clocked_time=parse_datetime(value))
+
+    def resolve(self, payload):
+        """Return ``{'<schedule>_id': id, ...}`` for the schedule given in ``payload``, or {} if none."""
+        given = [field for field in SCHEDULE_FIELDS if payload.get(field) or payload.get(field + '_id')]
+        if not given:
+            return {}
+        if len(given) > 1:
+            raise PayloadError('Only one of clocked, interval, crontab, or solar must be set')
+
+        field = given[0]
+        schedule_id = payload.get(field + '_id')
+        if schedule_id is None:
+            if field == 'solar':
+                raise PayloadError('Solar schedules must be given by `solar_id`')
+            schedule_id = getattr(self, field)(payload[field])
+
+        fk_values = {name + '_id': None for name in SCHEDULE_FIELDS}
+        fk_values[field + '_id'] = schedule_id
+        return fk_values
+
+
+def task_values(payload, resolver, partial=False):
+    """Column values of a periodic task from ``payload``.
+
+    With ``partial`` only the given fields are returned, for updates.
+    """
+    values = {field: payload[field] for field in TASK_FIELDS if field in payload}
+
+    for field, default in JSON_FIELDS.items():
+        if field in payload:
+            if not isinstance(payload[field], default):
+                raise PayloadError(f'`{field}` must be a JSON {"array" if default is list else "object"}')
+            values[field] = payload[field]
+        elif not partial:
+            values[field] = default()
+
+    for field in DATETIME_FIELDS:
+        if field in payload:
+            values[field] = parse_datetime(payload[field])
+
+    values.update(resolver.resolve(payload))
+
+    if not partial:
+        if not values.get('name') or not values.get('task'):
+            raise PayloadError('`name` and `task` are required')
+        if not any(values.get(field + '_id') for field in SCHEDULE_FIELDS):
+            raise PayloadError('One of clocked, interval, crontab, or solar must be set')
+
+    if values.get('expires') and values.get('expire_seconds') is not None:
+        raise PayloadError('Only one can be set, in expires and expire_seconds')
+    if values.get('clocked_id') and values.get('one_off') is False:
+        raise PayloadError('clocked must be one off, one_off must set True')
+    if values.get('clocked_id'):
+        values['one_off'] = True
+
+    for field in ('queue', 'exchange', 'routing_key'):
+        if field in values:
+            values[field] = values[field] or None
+
+    return values
+
+
+def lookup_task(session, item):
+    """Find a periodic task by ``id`` or ``name`` of ``item`` (a dict, an id or a name)."""
+    if not isinstance(item, dict):
+        item = {'id': item} if isinstance(item, int) else {'name': item}
+
+    query = session.query(PeriodicTask)
+    if item.get('id') is not None:
+        return query.filter_by(id=item['id']).first()
+    if item.get('name'):
+        return query.filter_by(name=item['name']).first()
+    raise PayloadError('`id` or `name` is required')
+
+
+def iter_task_records(session, chunk_size=IMPORT_CHUNK_SIZE):
+    """Yield every periodic task as a payload of ``task_values``, streamed ``chunk_size`` rows at a time.
+
+    Run state (``last_run_at``, ``total_run_count``) is not exported.
+    """
+    table = PeriodicTask.__table__
+    query = (
+        select(
+            *(table.c[field] for field in TASK_FIELDS + tuple(JSON_FIELDS) + DATETIME_FIELDS),
+            table.c.solar_id,
+            *(CrontabSchedule.__table__.c[field].label('crontab_' + field) for field in CRONTAB_FIELDS),
+            CrontabSchedule.timezone.label('crontab_timezone'),
+            IntervalSchedule.every, IntervalSchedule.period, ClockedSchedule.clocked_time,
+        )
+        .outerjoin(CrontabSchedule, CrontabSchedule.id == table.c.crontab_id)
+        .outerjoin(IntervalSchedule, IntervalSchedule.id == table.c.interval_id)
+        .outerjoin(ClockedSchedule, ClockedSchedule.id == table.c.clocked_id)
+        .order_by(table.c.id)
+        .execution_options(yield_per=chunk_size)
+    )
+
+    for row in session.execute(query).mappings():
+        record = {field: row[field] for field in TASK_FIELDS + tuple(JSON_FIELDS)}
+        for field in DATETIME_FIELDS:
+            record[field] = row[field] and row[field].isoformat()
+
+        if row['crontab_minute'] is not None:
+            record['crontab'] = {field: row['crontab_' + field] for field in CRONTAB_FIELDS}
+            record['crontab']['timezone'] = str(row['crontab_timezone'])
+        elif row['every'] is not None:
+            record['interval'] = dict(every=row['every'], period=row['period'])
+        elif row['clocked_time'] is not None:
+            record['clocked'] = row['clocked_time'].isoformat()
+        elif row['solar_id'] is not None:
+            record['solar_id'] = row['solar_id']
+
+        yield record
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_task_records(records, session=None, chunk_size=IMPORT_CHUNK_SIZE, prune=False):
+    """Make the periodic tasks match ``records`` (``(line, payload)`` pairs), matched by ``name``.
+
+    Records are read and compared against the database ``chunk_size`` at a time; only new and changed
+    tasks are written, with one executemany per chunk. With ``prune`` tasks missing from ``records``
+    are deleted, except celery's own (``celery.*``). The change version is bumped once, if anything
+    changed, and the caller commits. Returns the counts of created, updated, unchanged and deleted tasks.
+    """
+    session = session or db.session
+    resolver = ScheduleResolver(session)
+    table = PeriodicTask.__table__
+    counts = dict(created=0, updated=0, unchanged=0, deleted=0)
+    seen = set()
+    fields = None
+
+    for chunk in _chunks(records, chunk_size):
+        wanted = {}
+        for line, payload in chunk:
+            try:
+                if not isinstance(payload, dict):
+                    raise PayloadError('Each record must be an object')
+                values = dict(IMPORT_DEFAULTS, **task_values(payload, resolver))
+            except PayloadError as exc:
+                raise PayloadError(f'line {line}: {exc}')
+
+            if values['name'] in seen:
+                raise PayloadError(f'line {line}: duplicate task name {values["name"]!r}')
+            seen.add(values['name'])
+            wanted[values['name']] = values
+
+        fields = fields or sorted(next(iter(wanted.values())))
+        existing = {
+            row['name']: row for row in session.execute(
+                select(table.c.id, *(table.c[field] for field in fields)).where(table.c.name.in_(wanted))
+            ).mappings()
+        }
+
+        inserts, updates = [], []
+        for name, values in wanted.items():
+            row = existing.get(name)
+            if row is None:
+                inserts.append(values)
+            elif any(naive_utc(row[field]) != values[field] for field in fields):
+                updates.append(dict({'_' + field: values[field] for field in fields}, _id=row['id']))
+            else:
+                counts['unchanged'] += 1
+
+        if inserts:
+            session.execute(insert(table), inserts)
+        if updates:
+            session.execute(
+                update(table).where(table.c.id == bindparam('_id'))
+                .values({field: bindparam('_' + field) for field in fields}),
+                updates,
+            )
+        counts['created'] += len(inserts)
+        counts['updated'] += len(updates)
+
+    if prune:
+        stale = [
+            task_id for task_id, name in session.execute(
+                select(table.c.id, table.c.name).execution_options(yield_per=chunk_size)
+            )
+            if name not in seen and not name.startswith('celery.')
+        ]
+        for ids in _chunks(stale, chunk_size):
+            session.execute(delete(table).where(table.c.id.in_(ids)))
+        counts['deleted'] = len(stale)
+
+    if counts['created'] or counts['updated'] or counts['deleted']:
+        # Core statements skip the mapper events, bump the change version once for the whole import
+        PeriodicTasks.bump(session)
+
+    return counts
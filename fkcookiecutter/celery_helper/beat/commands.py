@@ -0,0 +1,111 @@
+"""Click commands of the celery beat database scheduler."""
+import click
+from flask.cli import with_appcontext
+
+from .utils import get_payload_codec, settings
+
+
+@click.group(invoke_without_command=True)
+@click.option("-l", "--loglevel", default="INFO", show_default=True, help="Logging level of beat")
+@click.option("--max-interval", type=float, default=None, help="Max seconds to sleep between schedule iterations")
+@click.pass_context
+@with_appcontext
+def beat(ctx, loglevel, max_interval):
+    """Celery beat database scheduler commands, without a command run the scheduler.
+
+    The scheduler runs inside this app's context, sharing its configuration and database engine.
+    """
+    if ctx.invoked_subcommand is not None:
+        return
+
+    from ..app import celery_app
+
+    celery_app.Beat(
+        loglevel=loglevel, max_interval=max_interval, scheduler=celery_app.conf.beat_scheduler,
+    ).run()
+
+
+@beat.command()
+@click.option("--hours", default=24, show_default=True, type=float, help="Forecast horizon in hours")
+@click.option("--top", default=10, show_default=True, help="Number of hot minutes to show")
+@click.option("-q", "--queue", "queues", multiple=True, help="Only show these queues")
+@with_appcontext
+def forecast(hours, top, queues):
+    """Forecast how many periodic tasks each queue receives per minute."""
+    from ..app import celery_app
+    from .forecast import forecast_load
+
+    result = forecast_load(hours=hours, app=celery_app)
+
+    if queues:
+        for name in list(result.queues):
+            if name not in queues:
+                result.queues.pop(name)
+
+    click.echo(f"Forecast from {result.start.isoformat()} for {result.minutes} minutes")
+    for queue, total in sorted(result.totals().items(), key=lambda item: item[1], reverse=True):
+        click.echo(f"  {queue}: {total} tasks, peak {max(result.queues[queue])}/min")
+
+    click.echo(f"Top {top} hot minutes:")
+    for minute, queue, count in result.hot_minutes(top=top):
+        click.echo(f"  {minute.isoformat()}  {queue}: {count}")
+
+    if result.skipped:
+        click.echo(f"Skipped {result.skipped} tasks with schedules that cannot be forecast")
+
+
+@beat.command("export")
+@click.option("-o", "--output", type=click.File("w"), default="-", help="JSONL file, default stdout")
+@click.option("--chunk-size", default=1000, show_default=True, help="Rows fetched per round-trip")
+@with_appcontext
+def export_tasks(output, chunk_size):
+    """Export periodic tasks as JSONL, one task per line."""
+    from .bulk import iter_task_records
+    from .models import db
+
+    dumps, _ = get_payload_codec(settings.get("BEAT_PAYLOAD_CODEC"))
+    count = 0
+
+    for record in iter_task_records(db.session, chunk_size=chunk_size):
+        output.write(dumps(record) + "\n")
+        count += 1
+
+    click.echo(f"Exported {count} periodic tasks", err=True)
+
+
+@beat.command("import")
+@click.argument("source", type=click.File("r"))
+@click.option("--chunk-size", default=1000, show_default=True, help="Records compared and written per batch")
+@click.option("--prune", is_flag=True, help="Delete periodic tasks missing from SOURCE")
+@click.option("--dry-run", is_flag=True, help="Report the changes and roll them back")
+@with_appcontext
+def import_tasks(source, chunk_size, prune, dry_run):
+    """Apply a JSONL export (SOURCE, "-" for stdin) to the periodic tasks, writing only the differences."""
+    from .bulk import PayloadError, import_task_records
+    from .models import db
+
+    _, loads = get_payload_codec(settings.get("BEAT_PAYLOAD_CODEC"))
+
+    def records():
+        for line, text in enumerate(source, 1):
+            if not text.strip():
+                continue
+            try:
+                yield line, loads(text)
+            except ValueError as exc:
+                raise PayloadError(f"line {line}: invalid JSON: {exc}")
+
+    try:
+        counts = import_task_records(records(), db.session, chunk_size=chunk_size, prune=prune)
+    except PayloadError as exc:
+        db.session.rollback()
+        raise click.ClickException(str(exc))
+
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+
+    click.echo("{}{created} created, {updated} updated, {unchanged} unchanged, {deleted} deleted".format(
+        "[dry run] " if dry_run else "", **counts
+    ))
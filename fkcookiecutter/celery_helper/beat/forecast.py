@@ -0,0 +1,317 @@
+"""Schedule load forecast: how many periodic tasks each queue receives per minute."""
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    from backports.zoneinfo import ZoneInfo
+
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from celery import current_app, schedules
+from sqlalchemy import func, select
+
+from .models import ClockedSchedule, CrontabSchedule, IntervalSchedule, PeriodicTask, db
+
+MINUTE = 60  # seconds
+MINUTE_US = MINUTE * 10 ** 6
+MICROSECOND = timedelta(microseconds=1)
+
+
+class Forecast:
+    """Per-minute fire histogram of each queue, starting at ``start`` (UTC, minute aligned)."""
+
+    def __init__(self, start, minutes):
+        self.start = start
+        self.minutes = minutes
+        self.queues = defaultdict(lambda: [0] * minutes)
+        self.skipped = 0  # enabled tasks that cannot be forecast, eg: solar schedules
+
+    def add(self, queue, index, count=1):
+        self.queues[queue][index] += count
+
+    def minute_at(self, index):
+        return self.start + timedelta(minutes=index)
+
+    def totals(self):
+        return {queue: sum(histogram) for queue, histogram in self.queues.items()}
+
+    def hot_minutes(self, top=10):
+        """The ``top`` busiest (datetime, queue, count) across all queues, busiest first."""
+        peaks = [
+            (count, queue, index)
+            for queue, histogram in self.queues.items()
+            for index, count in enumerate(histogram) if count
+        ]
+        peaks.sort(key=lambda item: item[0], reverse=True)
+        return [(self.minute_at(index), queue, count) for count, queue, index in peaks[:top]]
+
+
+class _FieldMasks:
+    """Bitsets over the forecast minutes, one per crontab field value."""
+
+    def __init__(self):
+        self.minute, self.hour = defaultdict(int), defaultdict(int)
+        self.day_of_week, self.day_of_month = defaultdict(int), defaultdict(int)
+        self.month_of_year = defaultdict(int)
+
+    def add(self, wall, bit):
+        self.minute[wall.minute] |= bit
+        self.hour[wall.hour] |= bit
+        self.day_of_week[wall.isoweekday() % 7] |= bit  # celery: 0 is Sunday
+        self.day_of_month[wall.day] |= bit
+        self.month_of_year[wall.month] |= bit
+
+    @staticmethod
+    def _union(masks, values):
+        mask = 0
+        for value in values:
+            mask |= masks.get(value, 0)
+        return mask
+
+    def match(self, crontab):
+        return (
+            self._union(self.minute, crontab.minute)
+            & self._union(self.hour, crontab.hour)
+            & self._union(self.day_of_week, crontab.day_of_week)
+            & self._union(self.day_of_month, crontab.day_of_month)
+            & self._union(self.month_of_year, crontab.month_of_year)
+        )
+
+
+class _MinuteMasks:
+    """Bitsets over the forecast minutes, one per crontab field value.
+
+    Bit ``i`` of ``hour[3]`` is set when minute ``i`` of the horizon falls in hour 3 (in ``tz``),
+    so matching a compiled crontab against every minute is a handful of big-int AND/OR operations.
+
+    DST changes are matched the way celery crontabs fire (the next wall clock time after the last run,
+    read with ``fold=0``): a wall clock time repeated when DST ends fires on its first pass only, and in
+    the minutes after DST starts only the first skipped wall clock time fires, at the offset before
+    the change, instead of the wall clock times before it.
+    """
+
+    def __init__(self, start, minutes, tz):
+        self.wall = _FieldMasks()
+        self.skipped = _FieldMasks()
+        self.gaps = []  # one mask of the minutes following each DST start
+
+        offsets = {(start - timedelta(days=1)).astimezone(tz).utcoffset()}
+        for index in range(minutes):
+            local = (start + timedelta(minutes=index)).astimezone(tz)
+            offsets.add(local.utcoffset())
+            if not local.fold:
+                self.wall.add(local, 1 << index)
+
+        if len(offsets) == 1:
+            return  # No DST change
+
+        previous = None
+        for index in range(minutes):
+            moment = start + timedelta(minutes=index)
+            for offset in offsets:
+                wall = (moment + offset).replace(tzinfo=None)
+                if wall.replace(tzinfo=tz).astimezone(timezone.utc) != moment:
+                    continue  # celery does not read `wall` as `moment`
+                if moment.astimezone(tz).replace(tzinfo=None) == wall:
+                    continue  # `wall` exists, added above
+
+                self.skipped.add(wall, 1 << index)
+                if previous != index - 1:
+                    self.gaps.append(0)
+                self.gaps[-1] |= 1 << index
+                previous = index
+
+    def match(self, crontab):
+        fires = self.wall.match(crontab)
+        if not self.gaps:
+            return fires
+
+        skipped = self.skipped.match(crontab)
+        for gap in self.gaps:
+            first = skipped & gap
+            if first:
+                first &= -first
+                fires = (fires & ~(gap & (first - 1))) | first
+        return fires
+
+
+def _iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _as_utc(value):
+    # Same as `maybe_make_aware`: naive datetimes from the database are in UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _minute_index(start, value):
+    return math.floor((_as_utc(value) - start).total_seconds() / MINUTE)
+
+
+def queue_resolver(app):
+    routes = app.conf.task_routes or {}
+    default_queue = app.conf.task_default_queue
+
+    def resolve(task, queue):
+        if queue:
+            return queue
+        route = routes.get(task) if isinstance(routes, dict) else None
+        return route and route.get('queue') or default_queue
+
+    return resolve
+
+
+def _forecast_crontabs(forecast, resolve_queue, enabled):
+    query = (
+        select(
+            PeriodicTask.task, PeriodicTask.queue, PeriodicTask.crontab_id,
+            PeriodicTask.start_time, func.count(),
+        )
+        .where(enabled, PeriodicTask.crontab_id.isnot(None))
+        .group_by(PeriodicTask.task, PeriodicTask.queue, PeriodicTask.crontab_id, PeriodicTask.start_time)
+    )
+    groups = db.session.execute(query).all()
+
+    crontab_ids = {crontab_id for _, _, crontab_id, _, _ in groups}
+    crontabs = {
+        row.id: row for row in db.session.execute(
+            select(CrontabSchedule).where(CrontabSchedule.id.in_(crontab_ids))
+        ).scalars()
+    } if crontab_ids else {}
+
+    masks_by_tz = {}
+    fires_by_crontab = {}
+
+    for task, queue, crontab_id, start_time, count in groups:
+        fires = fires_by_crontab.get(crontab_id)
+
+        if fires is None:
+            row = crontabs[crontab_id]
+            tz_name = row.timezone or 'UTC'
+            masks = masks_by_tz.get(tz_name)
+            if masks is None:
+                masks = masks_by_tz[tz_name] = _MinuteMasks(forecast.start, forecast.minutes, ZoneInfo(tz_name))
+
+            compiled = schedules.crontab(
+                minute=row.minute, hour=row.hour, day_of_week=row.day_of_week,
+                day_of_month=row.day_of_month, month_of_year=row.month_of_year,
+            )
+            fires = fires_by_crontab[crontab_id] = masks.match(compiled)
+
+        if start_time is not None:
+            first = _minute_index(forecast.start, start_time)
+            fires &= ~((1 << max(first, 0)) - 1)
+
+        queue = resolve_queue(task, queue)
+        for index in _iter_bits(fires):
+            forecast.add(queue, index, count)
+
+
+def _forecast_intervals(forecast, resolve_queue, enabled):
+    intervals = {
+        interval_id: timedelta(**{period: every}) // MICROSECOND
+        for interval_id, every, period in db.session.execute(
+            select(IntervalSchedule.id, IntervalSchedule.every, IntervalSchedule.period)
+        )
+    }
+    steps = {every_us: math.gcd(every_us, MINUTE_US) for every_us in intervals.values()}
+    query = (
+        select(PeriodicTask.task, PeriodicTask.queue, PeriodicTask.interval_id,
+               PeriodicTask.last_run_at, PeriodicTask.start_time)
+        .where(enabled, PeriodicTask.interval_id.isnot(None))
+    )
+
+    # The minutes an interval fires at repeat every `lcm(interval, 1 minute)`, shifted by the minute of its
+    # first run, and only depend on the phase of that run modulo `gcd(interval, 1 minute)`: tasks are grouped
+    # by queue, interval and phase, counting first runs per minute, and each group is spread with prefix sums.
+    starts = defaultdict(lambda: [0] * forecast.minutes)
+    horizon_end = forecast.minutes * MINUTE_US
+    # Same as `_as_utc`: naive datetimes from the database are in UTC
+    aware_start, naive_start = forecast.start, forecast.start.replace(tzinfo=None)
+
+    # Core rows, the ORM adds nothing to plain columns but per row overhead
+    for task, queue, interval_id, last_run_at, start_time in db.session.connection().execute(query).all():
+        every_us = intervals.get(interval_id)
+        if every_us is None:
+            continue
+        if every_us <= 0:
+            forecast.skipped += 1
+            continue
+
+        offset = 0  # microseconds from the horizon start
+        if last_run_at is not None:
+            since = last_run_at - (naive_start if last_run_at.tzinfo is None else aware_start)
+            offset = max(offset, since // MICROSECOND + every_us)
+        if start_time is not None:
+            since = start_time - (naive_start if start_time.tzinfo is None else aware_start)
+            offset = max(offset, since // MICROSECOND)
+
+        if offset < horizon_end:
+            step = steps[every_us]
+            starts[(resolve_queue(task, queue), every_us, offset % MINUTE_US // step * step)][offset // MINUTE_US] += 1
+
+    for (queue, every_us, phase), runs in starts.items():
+        # Tasks starting a cycle at each minute: those running first there, `stride`, `2 * stride` ... minutes before
+        step = steps[every_us]
+        stride = every_us // step
+        for index in range(stride, forecast.minutes):
+            runs[index] += runs[index - stride]
+
+        histogram = forecast.queues[queue]
+        fired = 0
+        for shift in range(min(stride + 1, forecast.minutes)):
+            # Fires of a cycle (`MINUTE_US // step` of them) in its `shift`th minute
+            total = min(-((phase - (shift + 1) * MINUTE_US) // every_us), MINUTE_US // step)
+            fires, fired = total - fired, total
+            if fires:
+                histogram[shift:] = [count + fires * more for count, more in zip(histogram[shift:], runs)]
+
+
+def _forecast_clocked(forecast, resolve_queue, enabled):
+    query = (
+        select(PeriodicTask.task, PeriodicTask.queue, PeriodicTask.last_run_at, ClockedSchedule.clocked_time)
+        .join(ClockedSchedule, ClockedSchedule.id == PeriodicTask.clocked_id)
+        .where(enabled)
+    )
+
+    for task, queue, last_run_at, clocked_time in db.session.execute(query):
+        index = _minute_index(forecast.start, clocked_time)
+        if index < 0:
+            if last_run_at is not None:
+                continue  # Already ran
+            index = 0  # Overdue and never run: fires at the next tick
+
+        if index < forecast.minutes:
+            forecast.add(resolve_queue(task, queue), index)
+
+
+def forecast_load(hours=24, start=None, app=None):
+    """Forecast the per-minute load of each queue over the next ``hours``, based on enabled periodic tasks.
+
+    Crontab schedules are compiled once per distinct crontab and matched against every minute of the
+    horizon with bitset operations, so the cost depends on the number of distinct schedules, not tasks.
+    Interval schedules are counted per minute arithmetically, tasks only cost a pass over their rows.
+    Solar schedules are not forecast, they are counted in ``Forecast.skipped``.
+    """
+    app = app or current_app
+    start = _as_utc(start or datetime.now(timezone.utc)).replace(second=0, microsecond=0)
+
+    forecast = Forecast(start=start, minutes=int(hours * 60))
+    resolve_queue = queue_resolver(app)
+    enabled = PeriodicTask.enabled.is_(True)
+
+    _forecast_crontabs(forecast, resolve_queue, enabled)
+    _forecast_intervals(forecast, resolve_queue, enabled)
+    _forecast_clocked(forecast, resolve_queue, enabled)
+
+    forecast.skipped += db.session.execute(
+        select(func.count()).select_from(PeriodicTask).where(enabled, PeriodicTask.solar_id.isnot(None))
+    ).scalar()
+
+    return forecast
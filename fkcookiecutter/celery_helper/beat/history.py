@@ -0,0 +1,117 @@
+"""Buffered dispatch history of periodic tasks."""
+import time
+from collections import deque
+from datetime import timedelta
+
+from celery.utils.log import get_logger
+from sqlalchemy import delete, insert
+
+from .models import PeriodicTaskDispatch, db
+from .utils import now, session_scope
+
+logger = get_logger(__name__)
+
+DEFAULT_BUFFER_SIZE = 10000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_RETENTION_DAYS = 7
+DEFAULT_PRUNE_INTERVAL = 60 * 60  # seconds
+
+
+class DispatchHistory:
+    """In-memory ring buffer of dispatches, flushed with multi-row inserts.
+
+    ``record`` only appends to the buffer, so beat pays no database round-trip per fire.
+    When the buffer is full the oldest records are dropped (and counted) instead of blocking dispatch.
+    """
+
+    Model = PeriodicTaskDispatch
+
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                 retention_days=DEFAULT_RETENTION_DAYS, prune_interval=DEFAULT_PRUNE_INTERVAL):
+        self._buffer = deque(maxlen=buffer_size)
+        self.batch_size = batch_size
+        self.retention = timedelta(days=retention_days) if retention_days else None
+        self.prune_interval = prune_interval
+
+        self.dropped = 0
+        self._last_prune = 0
+
+    @classmethod
+    def from_conf(cls, conf):
+        """Build from celery configuration, return None if history is disabled."""
+        if not conf.get('CELERYBEAT_DISPATCH_HISTORY', False):
+            return None
+
+        return cls(
+            buffer_size=conf.get('CELERYBEAT_DISPATCH_HISTORY_BUFFER_SIZE', DEFAULT_BUFFER_SIZE),
+            batch_size=conf.get('CELERYBEAT_DISPATCH_HISTORY_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+            retention_days=conf.get('CELERYBEAT_DISPATCH_HISTORY_RETENTION_DAYS', DEFAULT_RETENTION_DAYS),
+        )
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def record(self, entry, task_id=None, status=PeriodicTaskDispatch.SENT, queue=None):
+        """Buffer a dispatch of ``entry``, ``queue`` is the one it was routed to, else its ``queue`` option."""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+
+        self._buffer.append({
+            'periodic_task_name': entry.name,
+            'task': entry.task,
+            'task_id': task_id,
+            'queue': queue if queue is not None else entry.options.get('queue'),
+            'status': status,
+            'dispatched_at': now(),
+        })
+
+    def should_flush(self):
+        return len(self._buffer) >= self.batch_size
+
+    def flush(self):
+        """Write buffered records with one multi-row insert per batch."""
+        rows = []
+        while self._buffer:
+            rows.append(self._buffer.popleft())
+
+        if not rows:
+            self.maybe_prune()
+            return 0
+
+        statement = insert(self.Model.__table__)
+        try:
+            with session_scope():
+                for offset in range(0, len(rows), self.batch_size):
+                    db.session.execute(statement, rows[offset:offset + self.batch_size])
+                db.session.commit()
+        except Exception as exc:
+            logger.exception('DispatchHistory: flush %s records failed: %r', len(rows), exc)
+
+            # Put records back to retry on the next flush
+            self._buffer.extendleft(reversed(rows))
+            return 0
+
+        if self.dropped:
+            logger.warning('DispatchHistory: %s records were dropped, buffer is full', self.dropped)
+            self.dropped = 0
+
+        self.maybe_prune()
+        return len(rows)
+
+    def maybe_prune(self):
+        if not self.retention or time.monotonic() - self._last_prune < self.prune_interval:
+            return
+
+        self._last_prune = time.monotonic()
+        statement = delete(self.Model.__table__).where(
+            self.Model.__table__.c.dispatched_at < now() - self.retention
+        )
+
+        try:
+            with session_scope():
+                result = db.session.execute(statement)
+                db.session.commit()
+        except Exception as exc:
+            logger.exception('DispatchHistory: prune failed: %r', exc)
+        else:
+            logger.info('DispatchHistory: pruned %s records', result.rowcount)
@@ -6,18 +6,21 @@ except ImportError:
 
 import os
 from datetime import timedelta
+from functools import lru_cache
 
 from celery import schedules
 from cron_descriptor import get_description
 from flask import current_app as flask_app
 
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import ForeignKey, func, insert, update
+from sqlalchemy.types import JSON, TypeDecorator
 from sqlalchemy.orm import relationship
 from sqlalchemy.exc import MultipleResultsFound, NoResultFound
 
 from .clockedschedule import clocked
 from .tzcrontab import TzAwareCrontab
-from .utils import make_aware, now, flask_app
+from ...core.extensions import db
+from .utils import decode_payload, get_payload_codec, make_aware, now, settings
 
 DAYS = 'days'
 HOURS = 'hours'
@@ -53,7 +56,34 @@ SOLAR_SCHEDULES = [
     ("sunset", "日落"),
 ]
 
-db = flask_app.extensions["sqlalchemy"]
+# Maximum number of distinct cron expressions whose description is memoized
+CRON_DESCRIPTION_CACHE_SIZE = 2048
+
+
+class PayloadJSON(TypeDecorator):
+    """JSON column (de)serialized with the beat payload codec (``BEAT_PAYLOAD_CODEC``) instead of the engine's.
+
+    The column is still ``JSON`` in the database, only the beat columns (args, kwargs, headers) use the codec.
+    It is resolved when a statement is first compiled for the dialect.
+    """
+    impl = JSON
+    cache_ok = True
+
+    def bind_processor(self, dialect):
+        dumps = get_payload_codec(settings.get('BEAT_PAYLOAD_CODEC'))[0]
+
+        def process(value):
+            if value is JSON.NULL:
+                value = None
+            return dumps(value)
+        return process
+
+    def result_processor(self, dialect, coltype):
+        loads = get_payload_codec(settings.get('BEAT_PAYLOAD_CODEC'))[1]
+
+        def process(value):
+            return decode_payload(value, None, loads)
+        return process
 
 
 def cronexp(field):
@@ -61,6 +91,12 @@ def cronexp(field):
     return field and str(field).replace(' ', '') or '*'
 
 
+@lru_cache(maxsize=CRON_DESCRIPTION_CACHE_SIZE)
+def describe_cron(expression):
+    """Human readable description of a normalized cron expression, `get_description` is slow."""
+    return get_description(expression)
+
+
 def crontab_schedule_celery_timezone():
     """Return timezone string from Django settings ``CELERY_TIMEZONE`` variable.
 
@@ -234,13 +270,17 @@ class CrontabSchedule(db.Model):
     timezone = db.Column(db.String(128), nullable=False, default=crontab_schedule_celery_timezone, comment="Cron Timezone")
 
     @property
-    def human_readable(self):
-        human_readable = get_description('{} {} {} {} {}'.format(
+    def expression(self):
+        """Normalized cron expression: minute hour day_of_month month_of_year day_of_week."""
+        return '{} {} {} {} {}'.format(
             cronexp(self.minute), cronexp(self.hour),
             cronexp(self.day_of_month), cronexp(self.month_of_year),
             cronexp(self.day_of_week)
-        ))
-        return f'{human_readable} {str(self.timezone)}'
+        )
+
+    @property
+    def human_readable(self):
+        return f'{describe_cron(self.expression)} {str(self.timezone)}'
 
     def __str__(self):
         return '{} {} {} {} {} (m/h/dM/MY/d) {}'.format(
@@ -276,7 +316,7 @@ class CrontabSchedule(db.Model):
                 'day_of_week': schedule._orig_day_of_week,
                 'day_of_month': schedule._orig_day_of_month,
                 'month_of_year': schedule._orig_month_of_year,
-                'timezone': schedule.tz
+                'timezone': str(schedule.tz),  # pytz or zoneinfo (celery >= 5.3), stored by name
                 }
         instance = cls.query.filter_by(**spec).first()
 
@@ -308,27 +348,35 @@ class PeriodicTasks(db.Model):
 
     @classmethod
     def update_changed(cls, **kwargs):
-        instance = cls.query.get(**{"ident": 1})
-        if instance is None:
-            instance = cls(ident=1, last_update=now())
-        else:
-            instance.last_update = now()
-
-        db.session.add(instance)
+        cls.bump()
         db.session.commit()
 
+    @classmethod
+    def bump(cls, bind=None):
+        """Bump ``last_update`` inside the current transaction of ``bind`` (session or connection).
+
+        The caller commits.
+        """
+        bind = bind or db.session
+        table = cls.__table__
+        last_update = now()
+
+        result = bind.execute(update(table).where(table.c.ident == 1).values(last_update=last_update))
+        if not result.rowcount:
+            bind.execute(insert(table).values(ident=1, last_update=last_update))
+
     @classmethod
     def last_change(cls):
         instance = cls.query.filter_by(**{"ident": 1}).first()
         if instance:
-            return instance.no_changes
+            return instance.last_update
 
 
 class PeriodicTask(db.Model):
     """Model representing a periodic task."""
     __tablename__ = "celery_beat_periodictask"
 
-    id = db.Column(db.BigInteger, primary_key=True)
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)  # SQLite: rowid autoincrement
     name = db.Column(db.String(200), nullable=False, unique=True, comment="Name")
     task = db.Column(db.String(200), nullable=False, comment="Task Name")
 
@@ -354,12 +402,12 @@ class PeriodicTask(db.Model):
         nullable=True, comment="Clocked Schedule"
     )
 
-    args = db.Column(db.JSON, nullable=False, default="[]", comment="Positional Arguments")
-    kwargs = db.Column(db.JSON, nullable=False, default="{}", comment="Keyword Arguments")
+    args = db.Column(PayloadJSON, nullable=False, default=list, comment="Positional Arguments")
+    kwargs = db.Column(PayloadJSON, nullable=False, default=dict, comment="Keyword Arguments")
     queue = db.Column(db.String(200), nullable=True, default=None, comment="Queue Override")
     exchange = db.Column(db.String(200), nullable=True, default=None, comment="Exchange")
     routing_key = db.Column(db.String(200), nullable=True, default=None, comment="Routing Key")
-    headers = db.Column(db.JSON, nullable=False, default="{}", comment="AMQP Message Headers")
+    headers = db.Column(PayloadJSON, nullable=False, default=dict, comment="AMQP Message Headers")
     # Priority Number between 0 and 255.Supported by: RabbitMQ, Redis (priority reversed, 0 is highest).
     priority = db.Column(db.Integer, nullable=True, default=None, comment="Priority")
     expires = db.Column(db.DateTime, nullable=True, default=None, comment="Expires Datetime")
@@ -409,20 +457,19 @@ class PeriodicTask(db.Model):
         self.exchange = self.exchange or None
         self.routing_key = self.routing_key or None
         self.queue = self.queue or None
-        self.headers = self.headers or None
+        self.headers = self.headers or {}
         if not self.enabled:
             self.last_run_at = None
         self._clean_expires()
         self.validate_unique()
 
+        # `last_update` is bumped in the same transaction, see `signals.bump_changes`
         db.session.add(self)
         db.session.commit()
-        PeriodicTasks.changed(self)
 
     def delete(self, *args, **kwargs):
         db.session.delete(self)
         db.session.commit()
-        PeriodicTasks.changed(self)
 
     def _clean_expires(self):
         if self.expire_seconds is not None and self.expires:
@@ -468,3 +515,55 @@ class PeriodicTask(db.Model):
     @property
     def schedule(self):
         return self.scheduler.schedule
+
+
+class PeriodicTaskRow:
+    """Compact, detached copy of the :class:`PeriodicTask` columns the scheduler needs.
+
+    Unlike a live ORM instance it holds no session state and is not kept in the identity map,
+    changes are written back by primary key.
+    """
+    __slots__ = (
+        'id', 'name', 'task', 'enabled', 'one_off', 'start_time', 'last_run_at', 'total_run_count',
+        'queue', 'exchange', 'routing_key', 'priority', 'expires', 'expire_seconds',
+        'args', 'kwargs', 'headers', 'interval_id', 'crontab_id', 'solar_id', 'clocked_id',
+    )
+
+    def __init__(self, *values):
+        for field, value in zip(self.__slots__, values):
+            setattr(self, field, value)
+
+    @classmethod
+    def columns(cls):
+        return [getattr(PeriodicTask, field) for field in cls.__slots__]
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(*(getattr(model, field) for field in cls.__slots__))
+
+    @property
+    def expires_(self):
+        return self.expires or self.expire_seconds
+
+    def __repr__(self):
+        return f'<PeriodicTaskRow: {self.id} {self.name}>'
+
+
+class PeriodicTaskDispatch(db.Model):
+    """Append-only history of periodic task dispatches.
+
+    Rows are written in batches by :class:`~.history.DispatchHistory`, never per fire.
+    """
+    __tablename__ = "celery_beat_periodictaskdispatch"
+
+    SENT = 'sent'
+    SKIPPED = 'skipped'  # held back by queue depth backpressure
+    THROTTLED = 'throttled'  # held back by the beat rate limits
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)  # SQLite: rowid autoincrement
+    periodic_task_name = db.Column(db.String(200), nullable=False, index=True, comment="Periodic Task Name")
+    task = db.Column(db.String(200), nullable=False, comment="Task Name")
+    task_id = db.Column(db.String(155), nullable=True, default=None, comment="Task ID")
+    queue = db.Column(db.String(200), nullable=True, default=None, comment="Queue")
+    status = db.Column(db.String(32), nullable=False, default=SENT, comment="Dispatch Status")
+    dispatched_at = db.Column(db.DateTime, nullable=False, index=True, comment="Dispatch Datetime")
@@ -1,27 +1,42 @@
 """Beat Scheduler Implementation."""
+import copy
 import datetime
+import heapq
 import logging
 import math
+import time
 from multiprocessing.util import Finalize
 
 from celery import current_app, schedules
-from celery.beat import ScheduleEntry, Scheduler
+from celery.beat import ScheduleEntry, Scheduler, event_t
 from celery.utils.log import get_logger
 from celery.utils.time import maybe_make_aware
-from sqlalchemy.exc import NoResultFound, DatabaseError, InterfaceError, ResourceClosedError
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.exc import DatabaseError, InterfaceError
 from kombu.utils.encoding import safe_repr, safe_str
-from kombu.utils.json import dumps, loads
 
+from ..core.cached_property import cached_property
+from .backpressure import QueueDepthMonitor, RateLimiter
 from .clockedschedule import clocked
+from .forecast import queue_resolver
+from .history import DispatchHistory
 from .models import (ClockedSchedule, CrontabSchedule, IntervalSchedule,
-                     PeriodicTask, PeriodicTasks, SolarSchedule)
-from .utils import NEVER_CHECK_TIMEOUT, settings, flask_app
+                     PeriodicTask, PeriodicTaskDispatch, PeriodicTaskRow, PeriodicTasks, SolarSchedule, db)
+from .utils import NEVER_CHECK_TIMEOUT, settings, decode_payload, get_payload_codec, session_scope
 
 # This scheduler must wake up more frequently than the
 # regular of 5 minutes because it needs to take external
 # changes to the schedule into account.
 DEFAULT_MAX_INTERVAL = 5  # seconds
 
+# Bounds of the adaptive change poll, see `DatabaseScheduler.schedule_changed`
+DEFAULT_CHANGE_POLL_MIN_INTERVAL = 5  # seconds
+DEFAULT_CHANGE_POLL_MAX_INTERVAL = 60  # seconds
+DEFAULT_CHANGE_POLL_BACKOFF_FACTOR = 2
+
+# Time budget of dispatching the entries due in one tick, see `DatabaseScheduler.tick`
+DEFAULT_TICK_BUDGET = 1.0  # seconds
+
 ADD_ENTRY_ERROR = """\
 Cannot add entry %r to database schedule: %r. Contents: %r
 """
@@ -29,11 +44,12 @@ Cannot add entry %r to database schedule: %r. Contents: %r
 logger = get_logger(__name__)
 debug, info, warning = logger.debug, logger.info, logger.warning
 
-db = flask_app.extensions['sqlalchemy']
-
 
 class ModelEntry(ScheduleEntry):
-    """Scheduler entry taken from database row."""
+    """Scheduler entry taken from database row.
+
+    ``model`` is a detached :class:`PeriodicTaskRow`, the run state is written back by primary key.
+    """
 
     model_schedules = (
         (schedules.crontab, CrontabSchedule, 'crontab'),
@@ -41,30 +57,41 @@ class ModelEntry(ScheduleEntry):
         (schedules.solar, SolarSchedule, 'solar'),
         (clocked, ClockedSchedule, 'clocked')
     )
-    save_fields = ['last_run_at', 'total_run_count', 'no_changes']
+    save_fields = ['last_run_at', 'total_run_count']
 
-    def __init__(self, model, app=None):
-        """Initialize the model entry."""
+    # Decoded (args, kwargs, headers) of legacy string payloads by row id, with the raw values they came from
+    _payload_cache = {}
+    _payload_loads = None  # `loads` of the payload codec, resolved on first use
+
+    def __init__(self, model, app=None, payload=None, schedule=None):
+        """Initialize the model entry.
+
+        ``payload`` is the already decoded ``(args, kwargs, headers)`` of ``model``, eg: from ``__next__``.
+        ``schedule`` is the celery schedule of ``model``, eg: from ``load_schedules``, it is queried if not given.
+        """
         self.app = app or current_app._get_current_object()
         self.name = model.name
         self.task = model.task
-        try:
-            self.schedule = model.schedule
-        except model.DoesNotExist:
+        self.model = model
+
+        self.schedule = schedule if schedule is not None else self.load_schedule(model)
+        if self.schedule is None:
             logger.error(
                 'Disabling schedule %s that was removed from database',
                 self.name,
             )
             self._disable(model)
+            raise ValueError(f'Schedule of {self.name} does not exist')
+
         try:
-            self.args = loads(model.args or '[]')
-            self.kwargs = loads(model.kwargs or '{}')
+            self.args, self.kwargs, headers = payload or self.decode_payload(model)
         except ValueError as exc:
             logger.exception(
                 'Removing schedule %s for argument deseralization error: %r',
                 self.name, exc,
             )
             self._disable(model)
+            self.args, self.kwargs, headers = [], {}, {}
 
         self.options = {}
         for option in ['queue', 'exchange', 'routing_key', 'priority']:
@@ -73,14 +100,13 @@ class ModelEntry(ScheduleEntry):
                 continue
             self.options[option] = value
 
-        if getattr(model, 'expires_', None):
-            self.options['expires'] = getattr(model, 'expires_')
+        if model.expires_:
+            self.options['expires'] = model.expires_
 
-        self.options['headers'] = loads(model.headers or '{}')
+        self.options['headers'] = dict(headers)
         self.options['periodic_task_name'] = model.name
 
         self.total_run_count = model.total_run_count
-        self.model = model
 
         if not model.last_run_at:
             model.last_run_at = self._default_now()
@@ -94,10 +120,86 @@ class ModelEntry(ScheduleEntry):
 
         self.last_run_at = model.last_run_at
 
+    @classmethod
+    def schedule_key(cls, model):
+        """``(model_field, id)`` of the schedule row of ``model``, None if it has no schedule."""
+        for _, _, model_field in cls.model_schedules:
+            schedule_id = getattr(model, model_field + '_id')
+            if schedule_id is not None:
+                return model_field, schedule_id
+        return None
+
+    @classmethod
+    def load_schedules(cls, models):
+        """Celery schedules of ``models`` by ``schedule_key``, with one query per schedule type.
+
+        Tasks sharing a schedule row share the schedule object as well.
+        """
+        loaded = {}
+        for _, model_type, model_field in cls.model_schedules:
+            ids = {getattr(model, model_field + '_id') for model in models}
+            ids.discard(None)
+            if not ids:
+                continue
+
+            for obj in db.session.scalars(select(model_type).where(model_type.id.in_(ids))):
+                loaded[(model_field, obj.id)] = obj.schedule
+        return loaded
+
+    @classmethod
+    def load_schedule(cls, model):
+        key = cls.schedule_key(model)
+        if key is None:
+            return None
+        with session_scope():
+            return cls.load_schedules([model]).get(key)
+
+    @classmethod
+    def decode_payload(cls, model):
+        """Return ``(args, kwargs, headers)`` of ``model``.
+
+        JSON columns are decoded by the engine already, only legacy double-encoded strings
+        need decoding here, and that is done once per row version.
+        """
+        raw = (model.args, model.kwargs, model.headers)
+        if not any(isinstance(value, (str, bytes)) and value for value in raw):
+            return (
+                raw[0] if raw[0] is not None else [],
+                raw[1] if raw[1] is not None else {},
+                raw[2] if raw[2] is not None else {},
+            )
+
+        cached = cls._payload_cache.get(model.id)
+        if cached is not None and cached[0] == raw:
+            return cached[1]
+
+        loads = cls._payload_loads
+        if loads is None:
+            loads = cls._payload_loads = get_payload_codec(settings.get('BEAT_PAYLOAD_CODEC'))[1]
+        payload = (
+            decode_payload(raw[0], [], loads),
+            decode_payload(raw[1], {}, loads),
+            decode_payload(raw[2], {}, loads),
+        )
+        cls._payload_cache[model.id] = (raw, payload)
+        return payload
+
+    @staticmethod
+    def _write(pk, bump=False, **values):
+        """Write ``values`` to the periodic task ``pk`` and commit.
+
+        Core statements skip the mapper events, so the change version is only bumped if ``bump``.
+        """
+        table = PeriodicTask.__table__
+        with session_scope():
+            db.session.execute(update(table).where(table.c.id == pk).values(**values))
+            if bump:
+                PeriodicTasks.bump()
+            db.session.commit()
+
     def _disable(self, model):
-        model.no_changes = True
         model.enabled = False
-        model.save()
+        self._write(model.id, enabled=False)
 
     def is_due(self):
         if not self.model.enabled:
@@ -123,10 +225,8 @@ class ModelEntry(ScheduleEntry):
                 and self.model.total_run_count > 0:
             self.model.enabled = False
             self.model.total_run_count = 0  # Reset
-            self.model.no_changes = False  # Mark the model entry as changed
-
-            db.session.add(self.model)
-            db.session.commit()
+            # Mark the schedule as changed
+            self._write(self.model.id, bump=True, enabled=False, total_run_count=0)
 
             # Don't recheck
             return schedules.schedstate(False, NEVER_CHECK_TIMEOUT)
@@ -149,18 +249,31 @@ class ModelEntry(ScheduleEntry):
     def __next__(self):
         self.model.last_run_at = self._default_now()
         self.model.total_run_count += 1
-        self.model.no_changes = True
-        return self.__class__(self.model)
+        return self.__class__(
+            self.model, app=self.app,
+            payload=(self.args, self.kwargs, self.options['headers']), schedule=self.schedule,
+        )
     next = __next__  # for 2to3
 
     def save(self):
         # Object may not be synchronized, so only
         # change the fields we care about.
-        obj = type(self.model).query.get(self.model.pk)
-        for field in self.save_fields:
-            setattr(obj, field, getattr(self.model, field))
+        self._write(self.model.id, **{field: getattr(self.model, field) for field in self.save_fields})
 
-        obj.save()
+    @classmethod
+    def save_many(cls, entries):
+        """Write the run state of ``entries`` with one executemany UPDATE and one commit."""
+        table = PeriodicTask.__table__
+        statement = update(table).where(table.c.id == bindparam('_id')).values(
+            {field: bindparam('_' + field) for field in cls.save_fields}
+        )
+        params = [
+            dict(_id=entry.model.id, **{'_' + field: getattr(entry.model, field) for field in cls.save_fields})
+            for entry in entries
+        ]
+        with session_scope():
+            db.session.execute(statement, params)
+            db.session.commit()
 
     @classmethod
     def to_model_schedule(cls, schedule):
@@ -184,14 +297,19 @@ class ModelEntry(ScheduleEntry):
             else:
                 new_entry[k] = v
 
-        obj = PeriodicTask.query.filter_by(**new_entry).first()
+        # JSON columns can not be compared reliably, look the task up by its unique name
+        obj = PeriodicTask.query.filter_by(name=name).first()
 
         if obj is None:
             obj = PeriodicTask(**new_entry)
             db.session.add(obj)
             db.session.commit()
+        elif any(getattr(obj, k) != v for k, v in new_entry.items()):
+            for k, v in new_entry.items():
+                setattr(obj, k, v)
+            db.session.commit()
 
-        return cls(obj, app=app)
+        return cls(PeriodicTaskRow.from_model(obj), app=app)
 
     @classmethod
     def _unpack_fields(cls, schedule,
@@ -204,8 +322,8 @@ class ModelEntry(ScheduleEntry):
         entry_schedules[model_field] = model_schedule
         entry.update(
             entry_schedules,
-            args=dumps(args or []),
-            kwargs=dumps(kwargs or {}),
+            args=list(args or []),
+            kwargs=dict(kwargs or {}),
             **cls._unpack_options(**options or {})
         )
         return entry
@@ -219,7 +337,7 @@ class ModelEntry(ScheduleEntry):
             'exchange': exchange,
             'routing_key': routing_key,
             'priority': priority,
-            'headers': dumps(headers or {}),
+            'headers': dict(headers or {}),
             'expire_seconds': expire_seconds,
         }
 
@@ -241,10 +359,32 @@ class DatabaseScheduler(Scheduler):
     _last_timestamp = None
     _initial_read = True
     _heap_invalidated = False
+    _next_change_poll = 0
 
     def __init__(self, *args, **kwargs):
         """Initialize the database scheduler."""
         self._dirty = set()
+
+        # `Scheduler.__init__` already runs `setup_schedule`, which polls changes and syncs,
+        # so everything those use is set up first
+        app = kwargs['app'] if 'app' in kwargs else args[0]
+        conf = app.conf
+        self.change_poll_min_interval = conf.get(
+            'CELERYBEAT_CHANGE_POLL_MIN_INTERVAL', DEFAULT_CHANGE_POLL_MIN_INTERVAL)
+        self.change_poll_max_interval = max(
+            conf.get('CELERYBEAT_CHANGE_POLL_MAX_INTERVAL', DEFAULT_CHANGE_POLL_MAX_INTERVAL),
+            self.change_poll_min_interval)
+        self.change_poll_backoff_factor = conf.get(
+            'CELERYBEAT_CHANGE_POLL_BACKOFF_FACTOR', DEFAULT_CHANGE_POLL_BACKOFF_FACTOR)
+        self._change_poll_interval = self.change_poll_min_interval
+
+        self.tick_budget = conf.get('CELERYBEAT_TICK_BUDGET', DEFAULT_TICK_BUDGET)
+
+        self.history = DispatchHistory.from_conf(conf)
+        self.backpressure = QueueDepthMonitor.from_conf(app)
+        self.rate_limiter = RateLimiter.from_conf(app)
+        self._resolve_queue = queue_resolver(app)
+
         Scheduler.__init__(self, *args, **kwargs)
         self._finalize = Finalize(self, self.sync, exitpriority=5)
         self.max_interval = (
@@ -252,8 +392,6 @@ class DatabaseScheduler(Scheduler):
             or self.app.conf.beat_max_loop_interval
             or DEFAULT_MAX_INTERVAL)
 
-        self.db = flask_app.extensions["sqlalchemy"]
-
     def setup_schedule(self):
         self.install_default_entries(self.schedule)
         self.update_from_dict(self.app.conf.beat_schedule)
@@ -262,28 +400,51 @@ class DatabaseScheduler(Scheduler):
         debug('DatabaseScheduler: Fetching database schedule')
         s = {}
 
-        enabled_queryset = self.Model.get_enabled()
-        print('enabled_queryset:', enabled_queryset)
+        # Detached rows instead of ORM instances: the session does not track the whole schedule
+        query = select(*PeriodicTaskRow.columns()).where(self.Model.enabled.is_(True))
 
-        for model in enabled_queryset:
-            try:
-                s[model.name] = self.Entry(model, app=self.app)
-            except ValueError:
-                pass
+        with session_scope():
+            rows = [PeriodicTaskRow(*values) for values in db.session.execute(query)]
+            loaded = self.Entry.load_schedules(rows)
+
+            for row in rows:
+                try:
+                    s[row.name] = self.Entry(row, app=self.app, schedule=loaded.get(self.Entry.schedule_key(row)))
+                except ValueError:
+                    pass
+
+        # Forget decoded payloads of rows that are no longer scheduled
+        enabled_ids = {row.id for row in rows}
+        for model_id in set(self.Entry._payload_cache) - enabled_ids:
+            self.Entry._payload_cache.pop(model_id, None)
         return s
 
+    def _change_poll_due(self):
+        """Whether the adaptive change poll interval has elapsed."""
+        return time.monotonic() >= self._next_change_poll
+
+    def _reschedule_change_poll(self, changed):
+        """Tighten the poll interval after a change, back off while idle."""
+        if changed:
+            interval = self.change_poll_min_interval
+        else:
+            interval = min(
+                self._change_poll_interval * self.change_poll_backoff_factor,
+                self.change_poll_max_interval
+            )
+
+        self._change_poll_interval = interval
+        self._next_change_poll = time.monotonic() + interval
+
     def schedule_changed(self):
+        if not self._change_poll_due():
+            return False
+
         try:
-            # If MySQL is running with transaction isolation level
-            # REPEATABLE-READ (default), then we won't see changes done by
-            # other transactions until the current transaction is
-            # committed (Issue #41).
-            try:
-                db.session.commit()
-            except ResourceClosedError:
-                pass  # not in transaction management.
-
-            last, ts = self._last_timestamp, self.Changes.last_change()
+            # A fresh session per poll starts a new transaction, so changes committed by others
+            # are visible even with MySQL REPEATABLE-READ (Issue #41)
+            with session_scope():
+                last, ts = self._last_timestamp, self.Changes.last_change()
         except DatabaseError as exc:
             logger.exception('Database gave error: %r', exc)
             return False
@@ -294,12 +455,131 @@ class DatabaseScheduler(Scheduler):
             )
             return False
 
-        try:
-            if ts and ts > (last if last else ts):
-                return True
-        finally:
-            self._last_timestamp = ts
-        return False
+        changed = bool(ts and ts > (last if last else ts))
+        self._last_timestamp = ts
+        self._reschedule_change_poll(changed)
+
+        if changed:
+            debug('DatabaseScheduler: change seen, next poll in %ss', self._change_poll_interval)
+        return changed
+
+    def apply_async(self, entry, producer=None, advance=True, **kwargs):
+        if self.held_back(entry):
+            if advance:
+                self.reserve(entry)
+            return None
+
+        result = super().apply_async(entry, producer=producer, advance=advance, **kwargs)
+        self.record_dispatch(entry, result)
+        return result
+
+    @cached_property
+    def _priority_ascending(self):
+        """Redis treats priority 0 as the highest, AMQP the largest number."""
+        with self.app.connection_for_write() as connection:
+            return connection.transport.driver_type == 'redis'
+
+    def dispatch_order(self, entry, now_ts):
+        """Sort key of a due entry: higher priority first, then the earlier deadline (``expires``)."""
+        priority = entry.options.get('priority')
+        if priority is None:
+            rank = math.inf
+        else:
+            rank = priority if self._priority_ascending else -priority
+
+        expires = entry.options.get('expires')
+        if isinstance(expires, datetime.datetime):
+            deadline = maybe_make_aware(expires).timestamp()
+        elif expires is not None:
+            deadline = now_ts + expires
+        else:
+            deadline = math.inf
+
+        return rank, deadline
+
+    def tick(self, event_t=event_t, min=min, heappop=heapq.heappop, heappush=heapq.heappush):
+        """Run a tick: dispatch every due entry, ordered by ``dispatch_order``, within ``tick_budget`` seconds.
+
+        Entries left when the budget runs out stay in the heap, still due, and go first on the next tick.
+        Celery's tick dispatches one entry per call in heap order, so same-tick priority was lost.
+        """
+        max_interval = self.max_interval
+
+        if self._heap is None or not self.schedules_equal(self.old_schedulers, self.schedule):
+            self.old_schedulers = copy.copy(self.schedule)
+            self.populate_heap()
+
+        H = self._heap
+        if not H:
+            return max_interval
+
+        due = []
+        next_time_to_run = None
+        while H:
+            is_due, next_time_to_run = self.is_due(H[0][2])
+            if not is_due:
+                break
+            due.append((heappop(H), next_time_to_run))
+
+        if not due:
+            adjust = self.adjust(next_time_to_run)
+            return min(adjust if adjust is not None else max_interval, max_interval)
+
+        now_ts = time.time()
+        due.sort(key=lambda item: self.dispatch_order(item[0][2], now_ts))
+        budget_end = time.monotonic() + self.tick_budget if self.tick_budget else math.inf
+
+        for index, (event, next_time_to_run) in enumerate(due):
+            if index and time.monotonic() >= budget_end:
+                for left, _ in due[index:]:
+                    heappush(H, left)
+                warning('DatabaseScheduler: tick budget exceeded, %s due entries left for the next tick',
+                        len(due) - index)
+                break
+
+            entry = event[2]
+            next_entry = self.reserve(entry)
+            self.apply_entry(entry, producer=self.producer)
+            heappush(H, event_t(self._when(next_entry, next_time_to_run), event[1], next_entry))
+
+        return 0
+
+    def held_back(self, entry):
+        """Whether the fire of ``entry`` is skipped: its queue is over the depth limit, or it is rate limited.
+
+        The entry is advanced anyway, so fires missed while the queue drains are coalesced into
+        the next one instead of flooding the workers once they catch up.
+        """
+        if self.backpressure is None and self.rate_limiter is None:
+            return False
+
+        queue = self._resolve_queue(entry.task, entry.options.get('queue'))
+
+        if self.backpressure is not None and self.backpressure.over_limit(queue):
+            warning(
+                'DatabaseScheduler: skip %s, queue %s is over its depth limit (%s messages)',
+                entry.name, queue, self.backpressure.depths.get(queue),
+            )
+            status = PeriodicTaskDispatch.SKIPPED
+        elif self.rate_limiter is not None and not self.rate_limiter.consume(entry.name, queue):
+            warning('DatabaseScheduler: skip %s, rate limit of the task or queue %s is reached', entry.name, queue)
+            status = PeriodicTaskDispatch.THROTTLED
+        else:
+            return False
+
+        self.record_dispatch(entry, status=status, queue=queue)
+        return True
+
+    def record_dispatch(self, entry, result=None, status=PeriodicTaskDispatch.SENT, queue=None):
+        """Buffer a dispatch record, it is written to the database on sync."""
+        if self.history is None:
+            return
+
+        if queue is None:
+            queue = self._resolve_queue(entry.task, entry.options.get('queue'))
+        self.history.record(entry, task_id=getattr(result, 'id', None), status=status, queue=queue)
+        if self.history.should_flush():
+            self.history.flush()
 
     def reserve(self, entry):
         new_entry = next(entry)
@@ -311,38 +591,39 @@ class DatabaseScheduler(Scheduler):
     def sync(self):
         if logger.isEnabledFor(logging.DEBUG):
             debug('Writing entries...')
-        _tried = set()
-        _failed = set()
+        dirty, self._dirty = self._dirty, set()
+        # Entries removed from the schedule in the mean time are not written
+        entries = [self._schedule[name] for name in dirty if name in (self._schedule or {})]
         try:
-            while self._dirty:
-                name = self._dirty.pop()
-                try:
-                    self.schedule[name].save()
-                    _tried.add(name)
-                except (KeyError, NoResultFound):
-                    _failed.add(name)
+            if entries:
+                self.Entry.save_many(entries)
         except DatabaseError as exc:
             logger.exception('Database error while sync: %r', exc)
+            # retry later
+            self._dirty |= dirty
         except InterfaceError:
             warning(
                 'DatabaseScheduler: InterfaceError in sync(), '
                 'waiting to retry in next call...'
             )
-        finally:
-            # retry later, only for the failed ones
-            self._dirty |= _failed
+            self._dirty |= dirty
+
+        if self.history is not None:
+            self.history.flush()
 
     def update_from_dict(self, mapping):
         s = {}
 
-        for name, entry_fields in mapping.items():
-            try:
-                entry = self.Entry.from_entry(name, app=self.app, **entry_fields)
-                if entry.model.enabled:
-                    s[name] = entry
+        with session_scope():
+            for name, entry_fields in mapping.items():
+                try:
+                    entry = self.Entry.from_entry(name, app=self.app, **entry_fields)
+                    if entry.model.enabled:
+                        s[name] = entry
 
-            except Exception as exc:
-                logger.exception(ADD_ENTRY_ERROR, name, exc, entry_fields)
+                except Exception as exc:
+                    db.session.rollback()
+                    logger.exception(ADD_ENTRY_ERROR, name, exc, entry_fields)
         self.schedule.update(s)
 
     def install_default_entries(self, data):
@@ -357,6 +638,11 @@ class DatabaseScheduler(Scheduler):
             )
         self.update_from_dict(entries)
 
+    def close(self):
+        super().close()
+        if self.backpressure is not None:
+            self.backpressure.close()
+
     def schedules_equal(self, *args, **kwargs):
         if self._heap_invalidated:
             self._heap_invalidated = False
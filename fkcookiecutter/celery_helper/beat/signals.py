@@ -1,6 +1,6 @@
 """Models Application signals."""
-from flask_sqlalchemy.track_modifications import models_committed, before_models_committed
-from sqlalchemy.event import listens_for
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
 
 from .models import (
     ClockedSchedule,
@@ -8,20 +8,66 @@ from .models import (
     IntervalSchedule,
     SolarSchedule,
     PeriodicTask,
-    PeriodicTasks
+    PeriodicTasks,
+    db,
 )
 
+BEAT_MODELS = (PeriodicTask, IntervalSchedule, CrontabSchedule, SolarSchedule, ClockedSchedule)
+
+# Session.info key holding (root transaction, innermost transaction) of the last change version bump
+BUMPED_TRANSACTION_KEY = 'celery_beat_bumped_transaction'
+
+
+def bump_changes(mapper, connection, target):
+    """Bump ``PeriodicTasks.last_update`` once for a transaction touching beat models.
+
+    Listens to mapper events of the beat models only, so it costs nothing for the rest of the app
+    and does not need ``SQLALCHEMY_TRACK_MODIFICATIONS``. The bump runs on the flush connection,
+    i.e. in the same transaction. Changes made by the scheduler itself (``no_changes``) do not bump.
+    """
+    if isinstance(target, PeriodicTask) and target.no_changes:
+        return
+
+    session = object_session(target)
+    transaction = session is not None and session.get_transaction()
+
+    if transaction:
+        bumped = session.info.get(BUMPED_TRANSACTION_KEY)
+        if bumped and bumped[0] is transaction:
+            return
+        session.info[BUMPED_TRANSACTION_KEY] = (transaction, session.get_nested_transaction() or transaction)
+
+    PeriodicTasks.bump(connection)
+
+
+def forget_rolled_back_bump(session, previous_transaction):
+    """A rolled back savepoint takes the bump with it, bump again on the next change."""
+    bumped = session.info.get(BUMPED_TRANSACTION_KEY)
+    transaction = bumped and bumped[1]
+
+    while transaction is not None:
+        if transaction is previous_transaction:
+            session.info.pop(BUMPED_TRANSACTION_KEY, None)
+            break
+        transaction = transaction.parent
+
+
+def forget_bumped_transaction(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(BUMPED_TRANSACTION_KEY, None)
+
 
 def signals_connect():
     """Connect to signals."""
-    from .utils import settings
-    if not settings.get('SQLALCHEMY_TRACK_MODIFICATIONS'):
-        raise ValueError('Must set `SQLALCHEMY_TRACK_MODIFICATIONS` true')
-
-    models_committed.connect(PeriodicTasks.changed, sender=PeriodicTask)
-    before_models_committed.connect(PeriodicTasks.changed, sender=PeriodicTask)
+    for model in BEAT_MODELS:
+        for identifier in ('after_insert', 'after_update', 'after_delete'):
+            if not event.contains(model, identifier, bump_changes):
+                event.listen(model, identifier, bump_changes)
 
-    sender_list = [IntervalSchedule, CrontabSchedule, SolarSchedule, ClockedSchedule]
-    for sender in sender_list:
-        models_committed.connect(PeriodicTasks.update_changed, sender=sender)
-        before_models_committed.connect(PeriodicTasks.update_changed, sender=sender)
+    session_listeners = (
+        ('after_soft_rollback', forget_rolled_back_bump),
+        ('after_transaction_end', forget_bumped_transaction),
+    )
+    for identifier, listener in session_listeners:
+        if not event.contains(db.session, identifier, listener):
+            event.listen(db.session, identifier, listener)
@@ -27,10 +27,10 @@ def get_default_timezone():
     """
     Return the default time zone as a tzinfo instance.
 
-    This is the time zone defined by settings.TIME_ZONE.
+    This is the time zone defined by settings.TIME_ZONE, UTC if it is not set.
     """
     from .utils import settings
-    return zoneinfo.ZoneInfo(settings.TIME_ZONE)
+    return zoneinfo.ZoneInfo(settings.get('TIME_ZONE') or 'UTC')
 
 
 _active = Local()
@@ -72,7 +72,7 @@ def now():
     Return an aware or naive datetime.datetime, depending on settings.USE_TZ.
     """
     from .utils import settings
-    return datetime.now(tz=timezone.utc if settings.USE_TZ else None)
+    return datetime.now(tz=timezone.utc if settings.get('USE_TZ', False) else None)
 
 
 # By design, these four functions don't perform any checks on their arguments.
@@ -1,11 +1,19 @@
 """Utilities."""
+import threading
+from contextlib import contextmanager
 from importlib import import_module
 
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
+from flask import current_app, has_app_context
+from kombu.utils import json as kombu_json
+from werkzeug.local import LocalProxy
 
 from . import timezone
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 is_aware = timezone.is_aware
 # celery schedstate return None will make it not work
 NEVER_CHECK_TIMEOUT = 100000000
@@ -14,20 +22,90 @@ NEVER_CHECK_TIMEOUT = 100000000
 now_localtime = getattr(timezone, 'template_localtime', timezone.localtime)
 
 
-class LookupFlaskApp:
-    def __new__(cls, *args, **kwargs):
-        if not hasattr(cls, "_instance"):
-            cls._instance = object.__new__(cls, *args, **kwargs)
+def get_flask_app():
+    """The Flask app beat runs in: the current app, else one ``create_app()`` built for the process.
+
+    The beat models live on the app's ``db``, so the web app, the ``flask beat`` commands and
+    a standalone ``celery beat`` share one configuration and one engine per process.
+    """
+    global _flask_app
+
+    if has_app_context():
+        return current_app._get_current_object()
+
+    if _flask_app is None:
+        from ...app import create_app
+        _flask_app = create_app()
+    return _flask_app
+
+
+def get_payload_codec(name=None):
+    """Return ``(dumps, loads)`` of schedule payloads, ``name`` is 'json' (default) or 'orjson'.
+
+    Both codecs write and read kombu's type tags (``{"__type__": ..., "__value__": ...}``), so stored
+    payloads keep their meaning when the codec is switched. orjson writes UUIDs as plain strings.
+    """
+    if name in (None, '', 'json'):
+        return kombu_json.dumps, kombu_json.loads
+
+    if name == 'orjson':
+        if orjson is None:
+            raise ImportError('No module orjson, install `orjson` first!')
+
+        # datetimes are passed through so that they get kombu's tags instead of orjson's plain strings
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        default = kombu_json.JSONEncoder().default
+
+        def dumps(value):
+            return orjson.dumps(value, default=default, option=option).decode()
 
-            app = Flask('flask_celery_helper')
-            app.config.from_object('config.settings')
+        def loads(value):
+            marker = b'"__type__"' if isinstance(value, (bytes, bytearray)) else '"__type__"'
+            value_ = orjson.loads(value)
+            return restore_payload_types(value_) if marker in value else value_
 
-            db = SQLAlchemy()
-            db.init_app(app)
+        return dumps, loads
 
-            cls._instance.app = app
+    raise ValueError('Unsupported payload codec: %r' % name)
 
-        return cls._instance.app
+
+def restore_payload_types(value):
+    """Restore the values kombu tagged (datetime, Decimal, UUID, bytes ...) in an already decoded payload."""
+    if isinstance(value, dict):
+        return kombu_json.object_hook({k: restore_payload_types(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [restore_payload_types(v) for v in value]
+    return value
+
+
+def decode_payload(value, default, loads=kombu_json.loads):
+    """Decode a JSON column value; strings are legacy double-encoded payloads."""
+    if value is None or value == '':
+        return default
+    if isinstance(value, (str, bytes)):
+        return loads(value)
+    # Drivers decoding JSON by themselves (psycopg2) leave kombu's tags in the value
+    return restore_payload_types(value)
+
+
+@contextmanager
+def session_scope():
+    """Run the block with a short-lived ``db.session``.
+
+    Flask-SQLAlchemy scopes the session to the application context, so each scope pushes a fresh context
+    and gets its own session, which is removed and gives its connection back to the pool on exit,
+    even inside a long-lived context such as ``flask beat``. Nested scopes share the outer one.
+    """
+    if getattr(_session_scope, 'active', False):
+        yield
+        return
+
+    _session_scope.active = True
+    try:
+        with get_flask_app().app_context():
+            yield
+    finally:
+        _session_scope.active = False
 
 
 def make_aware(value):
@@ -102,5 +180,8 @@ def make_hashable(value):
     return value
 
 
-flask_app = LookupFlaskApp()
-settings = flask_app.config
+_flask_app = None
+_session_scope = threading.local()
+
+flask_app = LocalProxy(get_flask_app)
+settings = LocalProxy(lambda: get_flask_app().config)
@@ -0,0 +1,277 @@
+"""Periodic task management API."""
+import hashlib
+import hmac
+
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from ...core.extensions import csrf_protect
+from .bulk import PayloadError, ScheduleResolver, lookup_task, task_values
+from .models import ClockedSchedule, CrontabSchedule, IntervalSchedule, PeriodicTask, PeriodicTasks, db
+
+blueprint = Blueprint("beat", __name__, url_prefix="/beat")
+
+# Authorized by a bearer token, never by cookies (see `require_api_token`), so a cross-site request
+# can not act with the credentials of a browser and the cookie based CSRF check does not apply
+csrf_protect.exempt(blueprint)
+
+# Maximum number of tasks in one bulk request
+BULK_MAX_ITEMS = 5000
+
+# Page size of the periodic task listing
+LIST_DEFAULT_LIMIT = 100
+LIST_MAX_LIMIT = 1000
+
+
+@blueprint.before_request
+def require_api_token():
+    """Every endpoint needs ``Authorization: Bearer <BEAT_API_TOKEN>``, without the setting the API is disabled."""
+    token = current_app.config.get("BEAT_API_TOKEN")
+    if not token:
+        return jsonify(error="The periodic task API is disabled, set BEAT_API_TOKEN"), 403
+
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.encode(), token.encode()):
+        return jsonify(error="Invalid or missing API token"), 401, {"WWW-Authenticate": "Bearer"}
+    return None
+
+
+def bulk_items(key="tasks"):
+    payload = request.get_json(silent=True) or {}
+    items = payload.get(key) if isinstance(payload, dict) else payload
+
+    if not isinstance(items, list) or not items:
+        raise PayloadError(f"`{key}` must be a non-empty array")
+    if len(items) > BULK_MAX_ITEMS:
+        raise PayloadError(f"At most {BULK_MAX_ITEMS} tasks per request")
+    return items
+
+
+def bulk_response(results):
+    failed = sum(1 for result in results if not result["ok"])
+    return jsonify(succeeded=len(results) - failed, failed=failed, results=results)
+
+
+def apply_each(items, apply, resolver):
+    """Apply ``apply(item)`` to each item in its own savepoint and commit the batch once.
+
+    A failing item only rolls back its savepoint, and the schedules it created are forgotten
+    by ``resolver``; the change version is bumped once on commit.
+    """
+    results = []
+    session = db.session
+
+    for index, item in enumerate(items):
+        try:
+            with session.begin_nested():
+                task = apply(item)
+        except (PayloadError, SQLAlchemyError) as exc:
+            resolver.rollback()
+            results.append(dict(index=index, ok=False, error=str(exc)))
+        else:
+            resolver.commit()
+            results.append(dict(index=index, ok=True, id=task.id, name=task.name))
+
+    session.commit()
+    return results
+
+
+def _load_schedules(model, ids):
+    ids = {schedule_id for schedule_id in ids if schedule_id is not None}
+    if not ids:
+        return {}
+    return {row.id: row for row in db.session.scalars(select(model).where(model.id.in_(ids)))}
+
+
+def serialize_task(task, crontabs, intervals, clocks):
+    data = dict(
+        id=task.id, name=task.name, task=task.task, enabled=task.enabled, one_off=task.one_off,
+        queue=task.queue, exchange=task.exchange, routing_key=task.routing_key, priority=task.priority,
+        args=task.args, kwargs=task.kwargs, headers=task.headers,
+        expires=task.expires and task.expires.isoformat(), expire_seconds=task.expire_seconds,
+        start_time=task.start_time and task.start_time.isoformat(), description=task.description,
+        schedule=None,
+    )
+
+    crontab = crontabs.get(task.crontab_id)
+    interval = intervals.get(task.interval_id)
+    clocked = clocks.get(task.clocked_id)
+
+    if crontab is not None:
+        data["schedule"] = dict(
+            type="crontab", id=crontab.id, expression=crontab.expression,
+            timezone=crontab.timezone, human_readable=crontab.human_readable,
+        )
+    elif interval is not None:
+        data["schedule"] = dict(type="interval", id=interval.id, every=interval.every, period=interval.period)
+    elif clocked is not None:
+        data["schedule"] = dict(type="clocked", id=clocked.id, clocked_time=clocked.clocked_time.isoformat())
+    elif task.solar_id is not None:
+        data["schedule"] = dict(type="solar", id=task.solar_id)
+
+    return data
+
+
+def _bool_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+@blueprint.route("/tasks", methods=["GET"])
+def list_tasks():
+    """List periodic task definitions ordered by ``id``.
+
+    Query args: ``after_id`` (keyset cursor, the ``next_after_id`` of the previous page),
+    ``limit``, ``enabled``, ``task``, ``queue``. The ETag follows the change version of the schedules,
+    so run state (``last_run_at``, ``total_run_count``) is not listed.
+    """
+    after_id = request.args.get("after_id", type=int)
+    limit = min(max(request.args.get("limit", LIST_DEFAULT_LIMIT, type=int), 1), LIST_MAX_LIMIT)
+    enabled, task_name, queue = _bool_arg("enabled"), request.args.get("task"), request.args.get("queue")
+
+    last_update = PeriodicTasks.last_change()
+    version = f"{last_update.isoformat() if last_update else ''}|{request.query_string.decode()}"
+    etag = hashlib.md5(version.encode()).hexdigest()
+
+    if request.if_none_match.contains(etag):
+        return "", 304, {"ETag": f'"{etag}"'}
+
+    query = select(PeriodicTask).order_by(PeriodicTask.id).limit(limit)
+    if after_id is not None:
+        query = query.where(PeriodicTask.id > after_id)
+    if enabled is not None:
+        query = query.where(PeriodicTask.enabled.is_(enabled))
+    if task_name:
+        query = query.where(PeriodicTask.task == task_name)
+    if queue:
+        query = query.where(PeriodicTask.queue == queue)
+
+    tasks = db.session.scalars(query).all()
+    crontabs = _load_schedules(CrontabSchedule, [task.crontab_id for task in tasks])
+    intervals = _load_schedules(IntervalSchedule, [task.interval_id for task in tasks])
+    clocks = _load_schedules(ClockedSchedule, [task.clocked_id for task in tasks])
+
+    response = jsonify(
+        tasks=[serialize_task(task, crontabs, intervals, clocks) for task in tasks],
+        next_after_id=tasks[-1].id if len(tasks) == limit else None,
+    )
+    response.set_etag(etag)
+    return response
+
+
+@blueprint.errorhandler(PayloadError)
+def payload_error(error):
+    return jsonify(error=str(error)), 400
+
+
+@blueprint.route("/tasks/bulk/create", methods=["POST"])
+def bulk_create():
+    """Create periodic tasks: ``{"tasks": [{"name", "task", "crontab"|"interval"|"clocked", ...}]}``."""
+    items = bulk_items()
+    resolver = ScheduleResolver()
+
+    def create(item):
+        if not isinstance(item, dict):
+            raise PayloadError("Each task must be an object")
+
+        task = PeriodicTask(**task_values(item, resolver))
+        db.session.add(task)
+        db.session.flush()
+        return task
+
+    return bulk_response(apply_each(items, create, resolver))
+
+
+@blueprint.route("/tasks/bulk/update", methods=["POST"])
+def bulk_update():
+    """Update periodic tasks by ``id`` or ``name``, only the given fields are changed."""
+    items = bulk_items()
+    resolver = ScheduleResolver()
+
+    def modify(item):
+        if not isinstance(item, dict):
+            raise PayloadError("Each task must be an object")
+
+        task = lookup_task(db.session, item)
+        if task is None:
+            raise PayloadError("Periodic task not found")
+
+        values = task_values({k: v for k, v in item.items() if k != "id"}, resolver, partial=True)
+        for field, value in values.items():
+            setattr(task, field, value)
+        if values.get("enabled") is False:
+            task.last_run_at = None
+
+        db.session.flush()
+        return task
+
+    return bulk_response(apply_each(items, modify, resolver))
+
+
+def _bulk_statement(items, make_statement):
+    """Run one set-based statement for all found tasks, reporting missing ones per item."""
+    ids = {item for item in items if isinstance(item, int)}
+    names = {item for item in items if isinstance(item, str)}
+    for item in items:
+        if isinstance(item, dict):
+            item.get("id") is not None and ids.add(item["id"])
+            item.get("name") and names.add(item["name"])
+
+    found = db.session.execute(
+        select(PeriodicTask.id, PeriodicTask.name).where(
+            or_(PeriodicTask.id.in_(ids), PeriodicTask.name.in_(names))
+        )
+    ).all()
+    by_id = {row.id: row for row in found}
+    by_name = {row.name: row for row in found}
+
+    results = []
+    for index, item in enumerate(items):
+        key = item if not isinstance(item, dict) else item.get("id", item.get("name"))
+        row = by_id.get(key) if isinstance(key, int) else by_name.get(key)
+
+        if row is None:
+            results.append(dict(index=index, ok=False, error="Periodic task not found"))
+        else:
+            results.append(dict(index=index, ok=True, id=row.id, name=row.name))
+
+    if found:
+        # Set-based statements skip the mapper events, bump the change version explicitly
+        db.session.execute(make_statement([row.id for row in found]))
+        PeriodicTasks.bump()
+        db.session.commit()
+
+    return results
+
+
+@blueprint.route("/tasks/bulk/enable", methods=["POST"])
+def bulk_enable():
+    """Enable periodic tasks: ``{"tasks": [id | name | {"id"} | {"name"}]}``."""
+    results = _bulk_statement(
+        bulk_items(),
+        lambda ids: update(PeriodicTask).where(PeriodicTask.id.in_(ids)).values(enabled=True),
+    )
+    return bulk_response(results)
+
+
+@blueprint.route("/tasks/bulk/disable", methods=["POST"])
+def bulk_disable():
+    """Disable periodic tasks: ``{"tasks": [id | name | {"id"} | {"name"}]}``."""
+    results = _bulk_statement(
+        bulk_items(),
+        lambda ids: update(PeriodicTask).where(PeriodicTask.id.in_(ids)).values(enabled=False, last_run_at=None),
+    )
+    return bulk_response(results)
+
+
+@blueprint.route("/tasks/bulk/delete", methods=["POST"])
+def bulk_delete():
+    """Delete periodic tasks: ``{"tasks": [id | name | {"id"} | {"name"}]}``."""
+    results = _bulk_statement(
+        bulk_items(),
+        lambda ids: delete(PeriodicTask).where(PeriodicTask.id.in_(ids)),
+    )
+    return bulk_response(results)
@@ -21,7 +21,11 @@ def get_dotenv_config_path() -> str:
 
 def load_environs():
     env = environs.Env()
-    env.read_env(path=get_dotenv_config_path())
+    path = get_dotenv_config_path()
+
+    # Without the dotenv file (eg: tests), the process environment is used as is
+    if os.path.exists(path):
+        env.read_env(path=path)
 
 
 load_environs()
@@ -37,17 +41,74 @@ class HelperConfig:
     CELERY_NATIVE_AMQP = "%s.hooks.amqp:Amqp" % __name__.rsplit(".", 1)[0]
 
     # Each task function can save separately execution results to a different backend (Redis, DB, filesystem etc.)
-    # CELERY_TASK_BACKENDS = {
-    #     'redis': "redis://{user}:{password}@{host}:{port}/{db}".format(
-    #         user=os.getenv("REDIS:USER"), password=os.getenv("REDIS:PASSWORD"),
-    #         host=os.getenv("REDIS:HOST"), port=os.getenv("REDIS:PORT"), db=os.getenv("REDIS:DB0"),
-    #     ),
-    #
-    #     'flask_db': 'flask-db',          # Not implement: flask_celery_results.backends:DatabaseBackend
-    # }
+    # by name, eg: `def my_task(..., to_backend='redis')`. Backends are shared per url in each process
+    CELERY_TASK_BACKENDS = {
+        'redis': "redis://{user}:{password}@{host}:{port}/{db}".format(
+            user=os.getenv("REDIS:USER", ""), password=os.getenv("REDIS:PASSWORD", ""),
+            host=os.getenv("REDIS:HOST", "127.0.0.1"), port=os.getenv("REDIS:PORT", 6379),
+            db=os.getenv("REDIS:DB0", 0),
+        ),
+
+        # 'flask_db': 'flask-db',          # Not implement: flask_celery_results.backends:DatabaseBackend
+    }
 
     CELERY_TASK_WATCHER = False  # Watch task to monitor
 
+    # Idempotent tasks (`idempotent=True` / `idempotency_key` task options, or an `idempotency_key` per message) run
+    # once per key: the key is set in Redis (SET NX) before the task runs, held LEASE_TTL seconds while it runs and
+    # TTL seconds after it succeeded; a failed run deletes it. Duplicates are acked without running
+    CELERY_TASK_IDEMPOTENCY_REDIS_URL = os.getenv("CELERY_TASK_IDEMPOTENCY_REDIS_URL", CELERY_TASK_BACKENDS['redis'])
+    CELERY_TASK_IDEMPOTENCY_TTL = 24 * 60 * 60
+    CELERY_TASK_IDEMPOTENCY_LEASE_TTL = 10 * 60
+
+    # Each worker process keeps latency histograms per task: run time, queue wait (from `apply_async`, wall clock)
+    # and end-to-end. They are logged every EXPORT_INTERVAL seconds, or on demand:
+    #   celery -A fkcookiecutter.celery_helper.app inspect dump_task_latency
+    CELERY_TASK_LATENCY = True
+    CELERY_TASK_LATENCY_EXPORT_INTERVAL = 60
+
+    # Automatic retries of failed tasks (`BaseTaskContext.after_return`) wait a random countdown between 0 and
+    # `BACKOFF * 2 ** retries` seconds, capped at BACKOFF_MAX; without JITTER the upper bound itself is used
+    CELERY_TASK_RETRY_BACKOFF = 60
+    CELERY_TASK_RETRY_BACKOFF_MAX = 30 * 60
+    CELERY_TASK_RETRY_JITTER = True
+
+    # Token buckets of automatic retries per worker process, keyed by task name or queue name, the value is a rate
+    # or (rate, burst capacity), eg: {'myproject.tasks.sync_users': '30/m', 'sync_users_q': ('100/m', 20)}.
+    # A failed task retries only when every bucket that applies has a token, otherwise it fails as is
+    CELERY_TASK_RETRY_BUDGETS = {}
+
+    # Share of tasks whose INFO hook events (on_success, after_return, __call__) are logged, picked by task id.
+    # Retries and failures are always logged
+    CELERY_TASK_EVENT_SAMPLE_RATE = float(os.getenv("CELERY_TASK_EVENT_SAMPLE_RATE", 1.0))
+
+    # `DatabaseScheduler.schedule_changed` polls `celery_beat_periodictasks` adaptively: the interval is reset to
+    # MIN after a change is seen, and grows by FACTOR on every idle poll until it reaches MAX (seconds)
+    CELERYBEAT_CHANGE_POLL_MIN_INTERVAL = 5
+    CELERYBEAT_CHANGE_POLL_MAX_INTERVAL = 60
+    CELERYBEAT_CHANGE_POLL_BACKOFF_FACTOR = 2
+
+    # Record every beat dispatch into `celery_beat_periodictaskdispatch`, buffered in memory and written in batches
+    CELERYBEAT_DISPATCH_HISTORY = False
+    CELERYBEAT_DISPATCH_HISTORY_BUFFER_SIZE = 10000
+    CELERYBEAT_DISPATCH_HISTORY_BATCH_SIZE = 500
+    CELERYBEAT_DISPATCH_HISTORY_RETENTION_DAYS = 7
+
+    # Beat skips a fire while the queue of the task holds at least LIMIT messages, limits are keyed by the queue the
+    # task resolves to (queue option, task route, default queue), eg: {'celery': 1000, 'sync_users_q': 5000}.
+    # Queue depths are cached for TTL seconds (Redis `LLEN` pipeline, AMQP passive declare)
+    CELERYBEAT_QUEUE_DEPTH_LIMITS = {}
+    CELERYBEAT_QUEUE_DEPTH_TTL = 5
+
+    # Token buckets limiting how fast beat publishes, keyed by periodic task name or queue name, the value is a rate
+    # or (rate, burst capacity), eg: {'fan-out-reports': '10/m', 'sync_users_q': ('5/s', 20)}. Over the limit the fire
+    # is skipped. Unlike CELERY_ANNOTATIONS rate limits, messages are never published, so the broker is spared too
+    CELERYBEAT_RATE_LIMITS = {}
+
+    # Entries due in the same tick are dispatched by priority then deadline (`expires`), within BUDGET seconds;
+    # the rest waits for the next tick. 0 or None disables the budget
+    CELERYBEAT_TICK_BUDGET = 1.0
+
 
 class BaseCeleryConfig:
     """ Celery Standard basic configuration """
@@ -84,6 +145,12 @@ class BaseCeleryConfig:
 
     CELERY_RESULT_EXPIRES = 24 * 60 * 60  # 任务结果的过期时间，定期(periodic)任务好像会自动清理
 
+    # 任务结果策略 (core.results.ResultPolicy): 超过 THRESHOLD 字节的结果 zlib 压缩后存储;
+    # 设置 MAX_SIZE 后, 仍超过的结果不存储, 任务结果存为失败 (ResultTooLarge), 默认 None 不限制;
+    # 每个任务可用任务参数覆盖, 如 @celery_app.task(result_max_size=64 * 1024, result_expires=600), 返回注解为 `-> None` 的任务不存储结果
+    CELERY_RESULT_COMPRESS_THRESHOLD = 16 * 1024
+    CELERY_RESULT_MAX_SIZE = None
+
     # `flask-celery-beat` celery_helper.beat.schedulers:DatabaseScheduler (测试中)
     CELERYBEAT_SCHEDULER = "%s.hooks.schedulers:DatabaseScheduler" % __package__
 
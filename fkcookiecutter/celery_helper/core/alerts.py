@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from celery.utils.time import rate as parse_rate
+from kombu.utils.limits import TokenBucket
+
+__all__ = ["AlertDispatcher"]
+
+logger = logging.getLogger("celery.worker")
+
+
+class _Pending:
+    __slots__ = ("data", "count", "last_sent")
+
+    def __init__(self, data):
+        self.data = data
+        self.count = 0
+        self.last_sent = None
+
+
+class AlertDispatcher:
+    """ Sends alerts from a background thread, the caller only puts them into a bounded queue
+
+    Alerts with the same fingerprint (eg: task name and exception type) are sent at most once per
+    `dedupe_window` seconds: the first one goes out at the next flush, the repeats are counted and sent
+    as one digest when the window is over. At most `rate` alerts (a celery rate, eg: '20/m') are posted,
+    the others wait for the next flush. When the queue is full new alerts are dropped (and counted),
+    the caller never blocks.
+
+    Posts share one pooled `requests.Session`, with (connect, read) `timeout`. Forked children start
+    their own thread and session on first use.
+    """
+
+    def __init__(self, url_factory, maxsize=1000, flush_interval=5, dedupe_window=300, rate="20/m",
+                 max_fingerprints=1000, timeout=(3, 10), digest=None):
+        self.url_factory = url_factory
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval
+        self.dedupe_window = dedupe_window
+        self.max_fingerprints = max_fingerprints
+        self.timeout = timeout
+        self.digest = digest or (lambda data, count, window: data)
+
+        self._rate = parse_rate(rate)
+        self._reset()
+        atexit.register(self.close)
+
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.dropped = 0
+        self._queue = queue.Queue(self.maxsize)
+        self._pending = {}  # fingerprint => _Pending, in first seen order
+        self._bucket = TokenBucket(self._rate, capacity=max(int(self._rate * 60), 1)) if self._rate else None
+        self._session = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, data, fingerprint):
+        """ Queue an alert, never blocks. Returns False if it was dropped """
+        self._ensure_thread()
+
+        try:
+            self._queue.put_nowait((fingerprint, data))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="AlertDispatcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                self._collect(*item)
+
+            self.flush()
+            if stop:
+                return
+
+    def _collect(self, fingerprint, data):
+        pending = self._pending.get(fingerprint)
+        if pending is None:
+            pending = self._pending[fingerprint] = _Pending(data)
+        pending.count += 1
+
+    def flush(self, force=False):
+        now = time.monotonic()
+
+        for fingerprint, pending in list(self._pending.items()):
+            if not pending.count:
+                if pending.last_sent is None or now - pending.last_sent >= self.dedupe_window:
+                    del self._pending[fingerprint]  # Quiet for a whole window
+                continue
+
+            if not force and pending.last_sent is not None and now - pending.last_sent < self.dedupe_window:
+                continue  # Repeats of an alert sent in this window, sent as a digest later
+            if not force and self._bucket is not None and not self._bucket.can_consume():
+                continue  # Rate limited, next flush
+
+            count, pending.count, pending.last_sent = pending.count, 0, now
+            self.post(self.digest(pending.data, count, self.dedupe_window) if count > 1 else pending.data)
+
+        # Bound the memory of fingerprints, forgetting the oldest
+        overflow = len(self._pending) - self.max_fingerprints
+        for fingerprint in list(self._pending)[:max(overflow, 0)]:
+            self.dropped += self._pending.pop(fingerprint).count
+
+        if self.dropped:
+            logger.warning("AlertDispatcher: %s alerts dropped", self.dropped)
+            self.dropped = 0
+
+    def post(self, data):
+        if self._session is None:
+            self._session = requests.Session()
+            self._session.mount("http://", HTTPAdapter(pool_maxsize=2))
+            self._session.mount("https://", HTTPAdapter(pool_maxsize=2))
+
+        try:
+            response = self._session.post(
+                self.url_factory(), data=json.dumps(data), headers={'Content-Type': 'application/json'},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except Exception as e:
+            logger.error("AlertDispatcher: post alert <%s> failed: %r", data.get("title"), e)
+
+    def close(self, timeout=None):
+        """ Stop the thread, sending what is queued (ignoring the rate limit and the dedupe window) """
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+
+        try:
+            self._queue.put(None, timeout=1)
+        except queue.Full:
+            pass
+        thread.join(timeout if timeout is not None else sum(self.timeout) + 1)
+
+        if not thread.is_alive():
+            self.flush(force=True)
@@ -36,6 +36,8 @@ def autodiscover_task_imports(packages=None, related_name='tasks', task_prefix='
     module_package = __package__.split('.')[0] + '.apps'
 
     for name in packages_or_apps:
+        # Installed apps are sub packages of `<project>.apps`
+        name = name if name in packages else '.' + name
         package = importlib.import_module(name, package=module_package)
 
         file_path = os.path.dirname(os.path.abspath(package.__file__))
@@ -54,6 +56,10 @@ def autodiscover_task_imports(packages=None, related_name='tasks', task_prefix='
                 offset = app_name_cnt - 1 if app_name_cnt > 1 else 0
                 app_path_list = list(parent_parts_list[parent_parts_list.index(project_name) + offset:])
 
+                # Imported by its full name (`<project>.apps.<app>`), the module name is complete already
+                if mod_name.startswith(project_name + "."):
+                    app_path_list = []
+
                 if not module_info.ispkg:
                     task_module_name = mod_name
                     completed_task_path = ".".join(app_path_list + [task_module_name])
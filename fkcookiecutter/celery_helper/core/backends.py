@@ -0,0 +1,134 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from celery import Celery
+from celery.app import backends
+
+from .results import result_policy_backend
+
+__all__ = ["BackendRegistry", "backend_registry", "normalize_backend_url", "ResultPolicyCelery"]
+
+logger = logging.getLogger("celery.worker")
+
+
+def normalize_backend_url(url):
+    """ Equal backends get equal URLs: lower case scheme and host, sorted query, redis db defaults to 0 """
+    if "://" not in url:
+        return url  # an alias, eg: 'disabled'
+
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.rsplit("@", 1)
+    netloc[-1] = netloc[-1].lower()
+
+    path = parts.path.rstrip("/")
+    if scheme in ("redis", "rediss") and not path:
+        path = "/0"
+
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, "@".join(netloc), path, query, ""))
+
+
+class ResultPolicyCelery(Celery):
+    """ Celery app whose default backend applies the result policies of the tasks (see `core.results.ResultPolicy`)
+
+    `app.backend` stays what celery makes of it, one backend per thread, only its class gets
+    `ResultPolicyBackendMixin`. Backends of per-task `to_backend` URLs come from `BackendRegistry`.
+    """
+
+    def _get_backend(self):
+        backend_cls, url = backends.by_url(self.backend_cls or self.conf.result_backend, self.loader)
+        return result_policy_backend(backend_cls)(app=self, url=url)
+
+
+class BackendRegistry:
+    """ Process-wide result backends of per-task `to_backend`, shared by all tasks with the same URL
+
+    Backends (and their connection pools) are created on first use, at most `max_backends` are kept (least
+    recently checked are released first), and one is health checked every `health_check_interval` seconds
+    when it is used, a failing one is replaced. Backends apply the result policies of the tasks (see
+    `core.results.ResultPolicy`). Forked children (prefork pool) start with an empty registry,
+    so they never share the sockets of the parent.
+    """
+
+    def __init__(self, max_backends=16, health_check_interval=30):
+        self.max_backends = max_backends
+        self.health_check_interval = health_check_interval
+
+        self._backends = OrderedDict()  # normalized url => [backend, next health check]
+        self._keys = {}  # url => normalized url
+        self._lock = threading.Lock()
+
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def get(self, app, url):
+        key = self._keys.get(url)
+        if key is None:
+            key = self._keys[url] = normalize_backend_url(url)
+
+        entry = self._backends.get(key)
+        if entry is not None and time.monotonic() < entry[1]:
+            return entry[0]
+
+        with self._lock:
+            entry = self._backends.get(key)
+
+            if entry is not None and time.monotonic() >= entry[1]:
+                if self.is_healthy(entry[0]):
+                    entry[1] = time.monotonic() + self.health_check_interval
+                    self._backends.move_to_end(key)
+                else:
+                    logger.warning("BackendRegistry: backend %s failed its health check, replace it", key)
+                    self._release(self._backends.pop(key)[0])
+                    entry = None
+
+            if entry is None:
+                backend_cls, backend_url = backends.by_url(url, app.loader)
+                backend_cls = result_policy_backend(backend_cls)
+                entry = self._backends[key] = [
+                    backend_cls(app=app, url=backend_url), time.monotonic() + self.health_check_interval,
+                ]
+
+                while len(self._backends) > self.max_backends:
+                    _, (evicted, _) = self._backends.popitem(last=False)
+                    self._release(evicted)
+
+            return entry[0]
+
+    @staticmethod
+    def is_healthy(backend):
+        client = getattr(backend, "client", None)
+        ping = getattr(client, "ping", None)
+        if ping is None:
+            return True  # Nothing cheap to check, eg: database backends reconnect by themselves
+
+        try:
+            ping()
+        except Exception as e:
+            logger.warning("BackendRegistry: ping %r failed: %s", backend, e)
+            return False
+        return True
+
+    @staticmethod
+    def _release(backend):
+        pool = getattr(getattr(backend, "client", None), "connection_pool", None)
+        try:
+            pool and pool.disconnect()
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+    def _reset_after_fork(self):
+        # Drop, do not release: the pools belong to the parent process
+        self._backends = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._backends)
+
+
+backend_registry = BackendRegistry()
@@ -0,0 +1,69 @@
+from amqp.exceptions import MessageNacked
+
+__all__ = ["ChunkConfirms"]
+
+
+class ChunkConfirms:
+    """ Publisher confirms of one py-amqp channel, waited for once per chunk of messages
+
+    With `broker_transport_options={'confirm_publish': True}` py-amqp waits for the broker ack of every message
+    (`Channel.basic_publish_confirm`), a round trip per message. Here the messages are published over a connection
+    without `confirm_publish` (see `connection_for`), on a channel put in confirm mode once, the publisher counts
+    them (`published`) and `wait` blocks until the broker confirmed all of them.
+
+    The channel must be new: delivery tags are counted from its `confirm_select`.
+    """
+
+    def __init__(self, channel, timeout=None):
+        self.channel = channel
+        self.timeout = timeout
+
+        self._delivery_tag = 0
+        self._unconfirmed = set()
+        self._nacked = 0
+
+        channel.confirm_select()
+        channel.events["basic_ack"].add(self._on_ack)
+        channel.events["basic_nack"].add(self._on_nack)
+
+    @classmethod
+    def connection_for(cls, app):
+        """ A new connection of `app` to publish with chunk confirms, None unless `confirm_publish` is set (py-amqp) """
+        transport_options = app.conf.broker_transport_options or {}
+        if not transport_options.get("confirm_publish"):
+            return None
+
+        connection = app.connection_for_write(transport_options={"confirm_publish": False})
+        if connection.transport.driver_type != "amqp":
+            connection.release()
+            return None
+        return connection
+
+    def published(self):
+        """ Count a message published on the channel """
+        self._delivery_tag += 1
+        self._unconfirmed.add(self._delivery_tag)
+
+    def _confirm(self, delivery_tag, multiple):
+        if multiple:
+            confirmed = {tag for tag in self._unconfirmed if tag <= delivery_tag}
+        else:
+            confirmed = {delivery_tag} & self._unconfirmed
+
+        self._unconfirmed -= confirmed
+        return len(confirmed)
+
+    def _on_ack(self, delivery_tag, multiple):
+        self._confirm(delivery_tag, multiple)
+
+    def _on_nack(self, delivery_tag, multiple):
+        self._nacked += self._confirm(delivery_tag, multiple)
+
+    def wait(self):
+        """ Block until the broker confirmed every message published so far, `MessageNacked` if it rejected some """
+        while self._unconfirmed:
+            self.channel.connection.drain_events(timeout=self.timeout)
+
+        nacked, self._nacked = self._nacked, 0
+        if nacked:
+            raise MessageNacked("%s messages were nacked by the broker" % nacked)
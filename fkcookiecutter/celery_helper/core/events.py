@@ -0,0 +1,53 @@
+import logging
+import zlib
+
+__all__ = ["TaskEventLogger"]
+
+
+class _EventFields:
+    """ Fields of an event, formatted as `key=value` only when the log record is emitted """
+    __slots__ = ("fields",)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return " ".join("%s=%r" % item for item in self.fields.items())
+
+
+class TaskEventLogger:
+    """ Structured task events: `<TaskClass>.<hook> key=value ...`
+
+    Hook names are static strings (no stack inspection), fields are a plain dict passed as a lazy
+    logging argument, so they are formatted by the handler only. Callers check `enabled()` first and
+    build no fields at all when the level is off or the task is not sampled, eg:
+
+        >>> if task_events.enabled(task_id):
+        ...     task_events.emit(self, "on_success", dict(task_id=task_id, retval=retval))
+
+    `sample_rate` keeps that share of tasks at INFO and below, decided by task id, so a sampled task keeps
+    all of its events. Warnings and errors are never sampled out.
+    """
+
+    def __init__(self, logger, sample_rate=1.0):
+        self.logger = logger
+        self.sample_rate = sample_rate
+        self._sample_bound = int(sample_rate * 0xFFFFFFFF)
+
+    def sampled(self, task_id):
+        if self.sample_rate >= 1:
+            return True
+        if not task_id:
+            return False
+        return zlib.crc32(task_id.encode()) <= self._sample_bound
+
+    def enabled(self, task_id=None, level=logging.INFO):
+        if not self.logger.isEnabledFor(level):
+            return False
+        return level > logging.INFO or self.sampled(task_id)
+
+    def emit(self, task, hook, fields, level=logging.INFO):
+        self.logger.log(
+            level, "%s.%s %s", type(task).__name__, hook, _EventFields(fields),
+            extra=dict(task_event=hook, task_event_fields=fields),
+        )
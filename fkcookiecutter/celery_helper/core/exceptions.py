@@ -10,3 +10,15 @@ class CeleryVersionError(CeleryError):
 class ImproperlyConfigured(CeleryError):
     """ improperly configured"""
     pass
+
+
+class BulkSendError(CeleryError):
+    """ Publishing of `TaskContext.send_many` failed, `sent` holds the ids of the messages published before. """
+
+    def __init__(self, message, sent):
+        super().__init__(message)
+        self.sent = sent
+
+
+class ResultTooLarge(CeleryError):
+    """ The result of a task was over its `result_max_size` and not stored, it is stored as a failure instead. """
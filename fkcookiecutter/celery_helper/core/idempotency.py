@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+import logging
+
+__all__ = ["IdempotencyGuard"]
+
+logger = logging.getLogger("celery.worker")
+
+# Take the lease, or renew it when this task already holds it: a message redelivered after its worker
+# died (acks late) keeps its task id
+_ACQUIRE_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return 1
+end
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# Release the lease only if this task still holds it
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Mark the key done (kept `ttl` seconds) only if this task still holds it
+_DONE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+end
+return nil
+"""
+
+
+class IdempotencyGuard:
+    """ Drops duplicate executions of a task message by an idempotency key, checked atomically in Redis
+
+    Before the task runs, `acquire` sets the key with `SET NX EX lease_ttl`: when it is already set, an
+    execution with the same key is running or has succeeded and this one is a duplicate. On success the key
+    is kept for `ttl` seconds (`done`), on failure it is deleted (`release`) so retries run. A worker that
+    dies while running leaves the lease: the redelivered message (same task id, the lease token) takes it
+    over at once, other executions wait for it to expire after `lease_ttl` seconds.
+
+    Keys are given per message (`idempotency_key` header), computed by the task `idempotency_key` option
+    (a callable of the task arguments), or hashed from the task name and arguments.
+    """
+
+    def __init__(self, url, prefix="celery-idempotency:", ttl=24 * 60 * 60, lease_ttl=10 * 60):
+        self.url = url
+        self.prefix = prefix
+        self.ttl = ttl
+        self.lease_ttl = lease_ttl
+
+        self._client = None
+        self._pid = None
+        self._scripts = None
+
+    @property
+    def client(self):
+        if self._client is None or self._pid != os.getpid():
+            import redis
+
+            self._client = redis.Redis.from_url(self.url)
+            self._pid = os.getpid()
+            self._scripts = (
+                self._client.register_script(_RELEASE_SCRIPT), self._client.register_script(_DONE_SCRIPT),
+                self._client.register_script(_ACQUIRE_SCRIPT),
+            )
+        return self._client
+
+    def key_for(self, task_name, args, kwargs, key=None, key_func=None):
+        if key is None and key_func is not None:
+            key = key_func(*(args or ()), **(kwargs or {}))
+
+        if key is None:
+            arguments = json.dumps([args or [], kwargs or {}], sort_keys=True, default=repr)
+            key = hashlib.sha1(arguments.encode()).hexdigest()
+
+        return "%s%s:%s" % (self.prefix, task_name, key)
+
+    def acquire(self, key, token):
+        """ True if this execution may run, False if it is a duplicate. Fails open when Redis is unavailable """
+        try:
+            return bool(self._script(2)(keys=[key], args=[token, self.lease_ttl]))
+        except Exception as e:
+            logger.warning("IdempotencyGuard: acquire %s failed, run the task: %r", key, e)
+            return True
+
+    def _script(self, index):
+        self.client  # noqa: the scripts are registered with the client of this process
+        return self._scripts[index]
+
+    def done(self, key, token):
+        try:
+            self._script(1)(keys=[key], args=[token, "done:%s" % token, self.ttl])
+        except Exception as e:
+            logger.warning("IdempotencyGuard: mark %s done failed: %r", key, e)
+
+    def release(self, key, token):
+        try:
+            self._script(0)(keys=[key], args=[token])
+        except Exception as e:
+            logger.warning("IdempotencyGuard: release %s failed: %r", key, e)
@@ -0,0 +1,36 @@
+from celery.utils.time import rate
+from kombu.utils.limits import TokenBucket
+
+__all__ = ["TokenBuckets"]
+
+
+class TokenBuckets:
+    """ Token buckets by key, eg: task names and queue names
+
+    `limits` maps a key to a celery rate (eg: '10/m') or to (rate, capacity) to allow bursts of `capacity`.
+    A zero rate is unlimited, same as celery task rate limits. `consume` needs a token from every bucket
+    that applies and takes them only when all of them have one. Not thread safe, like `TokenBucket`.
+    """
+
+    def __init__(self, limits=None):
+        self.buckets = {}
+
+        for key, limit in (limits or {}).items():
+            try:
+                fill_rate, capacity = limit if isinstance(limit, (tuple, list)) else (limit, 1)
+                fill_rate, capacity = rate(fill_rate), float(capacity)
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("Invalid rate limit of %s: %r" % (key, limit)) from None
+
+            if fill_rate:
+                self.buckets[key] = TokenBucket(fill_rate, capacity=capacity)
+
+    def consume(self, *keys):
+        """ Take a token from the buckets of `keys`, False (and nothing taken) if one of them is empty """
+        buckets = [self.buckets[key] for key in keys if key in self.buckets]
+        if any(bucket.expected_time() for bucket in buckets):
+            return False
+
+        for bucket in buckets:
+            bucket.can_consume()
+        return True
@@ -0,0 +1,107 @@
+import math
+import time
+import threading
+
+__all__ = ["LatencyHistogram", "TaskLatency"]
+
+
+class LatencyHistogram:
+    """ Log-bucketed histogram of nanosecond latencies, fixed memory whatever the number of samples
+
+    Each power of two is split into `SUB_BUCKETS` buckets, so a percentile is within ~9% of the exact
+    value, from 1ns up to 2 ** `MAX_EXPONENT` ns (~73 minutes); longer latencies go in the last bucket.
+    """
+    SUB_BUCKETS = 8
+    MAX_EXPONENT = 42
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (self.SUB_BUCKETS * self.MAX_EXPONENT + 1)
+        self.count = self.total = self.max = 0
+
+    def record(self, ns):
+        ns = max(int(ns), 1)
+        index = min(int(math.log2(ns) * self.SUB_BUCKETS), len(self.counts) - 1)
+
+        self.counts[index] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, q):
+        """ Upper bound of the bucket holding the `q` (0 - 1) percentile, in nanoseconds """
+        if not self.count:
+            return 0
+
+        rank = max(math.ceil(q * self.count), 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(2 ** ((index + 1) / self.SUB_BUCKETS), self.max)
+        return self.max
+
+    def summary(self):
+        """ count, mean, p50, p90, p99 and max, in milliseconds """
+        return dict(
+            count=self.count,
+            mean_ms=round(self.total / self.count / 1e6, 3) if self.count else 0,
+            p50_ms=round(self.percentile(0.5) / 1e6, 3),
+            p90_ms=round(self.percentile(0.9) / 1e6, 3),
+            p99_ms=round(self.percentile(0.99) / 1e6, 3),
+            max_ms=round(self.max / 1e6, 3),
+        )
+
+
+class TaskLatency:
+    """ Latency histograms per task and kind (`run`, `queue_wait`, `end_to_end`) of this worker process
+
+    Every `export_interval` seconds (checked when a sample is recorded, no thread) the summaries are logged,
+    one line per task and kind, and the histograms start over, so each export covers one interval.
+    `snapshot()` gives the same summaries on demand, eg: from a remote control command.
+    """
+    KINDS = ("run", "queue_wait", "end_to_end")
+
+    def __init__(self, logger, export_interval=60):
+        self.logger = logger
+        self.export_interval = export_interval
+
+        self._histograms = {}  # (task name, kind) => LatencyHistogram
+        self._lock = threading.Lock()
+        self._export_at = time.monotonic() + export_interval if export_interval else None
+
+    def record(self, task_name, kind, ns):
+        histogram = self._histograms.get((task_name, kind))
+        if histogram is None:
+            histogram = self._histograms.setdefault((task_name, kind), LatencyHistogram())
+        histogram.record(ns)
+
+        if self._export_at is not None and time.monotonic() >= self._export_at:
+            self.export()
+
+    def snapshot(self, reset=False):
+        """ {task name: {kind: summary}} """
+        with self._lock:
+            histograms = self._histograms
+            if reset:
+                self._histograms = {}
+
+        result = {}
+        for (task_name, kind), histogram in sorted(histograms.items()):
+            result.setdefault(task_name, {})[kind] = histogram.summary()
+        return result
+
+    def export(self, reset=True):
+        if self.export_interval:
+            self._export_at = time.monotonic() + self.export_interval
+
+        result = self.snapshot(reset=reset)
+        for task_name, kinds in result.items():
+            for kind, summary in kinds.items():
+                self.logger.info(
+                    "TaskLatency %s %s %s", task_name, kind, " ".join("%s=%s" % item for item in summary.items()),
+                    extra=dict(task_latency=dict(summary, task=task_name, kind=kind)),
+                )
+        return result
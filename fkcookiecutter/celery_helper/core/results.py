@@ -0,0 +1,130 @@
+import zlib
+import base64
+import logging
+
+from celery import states
+from kombu.serialization import loads
+
+from .exceptions import ResultTooLarge
+
+__all__ = ["ResultPolicy", "ResultPolicyBackendMixin", "result_policy_backend", "RESULT_POLICY_KEY"]
+
+logger = logging.getLogger("celery.worker")
+
+# Stored results changed by a policy are dicts with this key: {"__result_policy__": "zlib", "data": ...}
+RESULT_POLICY_KEY = "__result_policy__"
+
+
+class ResultPolicy:
+    """ How the successful results of one task are stored, from the task options, eg:
+
+        >>> @celery_app.task(result_compress_threshold=1024, result_max_size=64 * 1024, result_expires=600)
+        ... def my_task(**kwargs):
+        ...     return kwargs
+
+        - result_compress_threshold: results encoded to more bytes are stored zlib compressed
+        - result_max_size: results still bigger are not stored, the task is stored as failed with `ResultTooLarge`
+          instead, so `AsyncResult.get()` raises it
+        - result_expires: seconds to keep the result, instead of `CELERY_RESULT_EXPIRES` (Redis backends)
+
+    The same options can be given by `CELERY_ANNOTATIONS`. None disables each of them.
+    """
+    __slots__ = ("compress_threshold", "max_size", "expires")
+
+    def __init__(self, compress_threshold=None, max_size=None, expires=None):
+        self.compress_threshold = compress_threshold
+        self.max_size = max_size
+        self.expires = expires
+
+    @classmethod
+    def from_task(cls, task):
+        return cls(
+            compress_threshold=getattr(task, "result_compress_threshold", None),
+            max_size=getattr(task, "result_max_size", None),
+            expires=getattr(task, "result_expires", None),
+        )
+
+    @property
+    def is_noop(self):
+        return self.compress_threshold is None and self.max_size is None and self.expires is None
+
+
+NOOP_POLICY = ResultPolicy()
+
+
+class ResultPolicyBackendMixin:
+    """ Applies the `ResultPolicy` of the task to the results it stores, and decompresses them when read back.
+        Mixed into `app.backend` (`ResultPolicyCelery`) and the backends of `BackendRegistry`, see `result_policy_backend`.
+    """
+
+    def result_policy(self, task_name):
+        policies = self.__dict__.setdefault("_result_policies", {})
+        policy = policies.get(task_name)
+
+        if policy is None:
+            task = self.app.tasks.get(task_name) if task_name else None
+            policy = policies[task_name] = ResultPolicy.from_task(task) if task is not None else NOOP_POLICY
+        return policy
+
+    def store_result(self, task_id, result, state, traceback=None, request=None, **kwargs):
+        policy = self.result_policy(getattr(request, "task", None))
+
+        if policy.is_noop or state != states.SUCCESS:
+            return super().store_result(task_id, result, state, traceback=traceback, request=request, **kwargs)
+
+        result = self.apply_result_policy(policy, task_id, result)
+        if isinstance(result, ResultTooLarge):
+            state = states.FAILURE
+        stored = super().store_result(task_id, result, state, traceback=traceback, request=request, **kwargs)
+
+        if policy.expires is not None and hasattr(self, "expire"):
+            # Redis backends, the key was just set with the global expires
+            self.expire(self.get_key_for_task(task_id), int(policy.expires))
+        return stored
+
+    def apply_result_policy(self, policy, task_id, result):
+        if policy.compress_threshold is None and policy.max_size is None:
+            return result
+
+        content_type, content_encoding, payload = self._encode(result)
+        payload = payload.encode(content_encoding or "utf-8") if isinstance(payload, str) else payload
+        size = len(payload)
+
+        if policy.compress_threshold is not None and size > policy.compress_threshold:
+            payload = zlib.compress(payload)
+            result = {
+                RESULT_POLICY_KEY: "zlib", "content_type": content_type, "content_encoding": content_encoding,
+                "data": base64.b64encode(payload).decode(),
+            }
+
+        if policy.max_size is not None and len(payload) > policy.max_size:
+            logger.warning("ResultPolicy: result of task<%s> is %s bytes, over %s, not stored", task_id, size, policy.max_size)
+            result = ResultTooLarge("Result of %s bytes over the max size %s" % (size, policy.max_size))
+
+        return result
+
+    def meta_from_decoded(self, meta):
+        meta = super().meta_from_decoded(meta)
+        result = meta.get("result")
+
+        if isinstance(result, dict) and result.get(RESULT_POLICY_KEY) == "zlib":
+            meta["result"] = self.decode_compressed_result(result)
+        return meta
+
+    def decode_compressed_result(self, result):
+        payload = zlib.decompress(base64.b64decode(result["data"]))
+        return loads(payload, result["content_type"], result["content_encoding"], accept=self.accept)
+
+
+_policy_backend_classes = {}
+
+
+def result_policy_backend(backend_cls):
+    """ `backend_cls` with `ResultPolicyBackendMixin`, one subclass per backend class """
+    policy_cls = _policy_backend_classes.get(backend_cls)
+
+    if policy_cls is None:
+        policy_cls = _policy_backend_classes[backend_cls] = type(
+            backend_cls.__name__, (ResultPolicyBackendMixin, backend_cls), {"__module__": backend_cls.__module__},
+        )
+    return policy_cls
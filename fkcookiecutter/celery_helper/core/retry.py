@@ -0,0 +1,33 @@
+import random
+
+from .limits import TokenBuckets
+
+__all__ = ["RetryPolicy"]
+
+
+class RetryPolicy:
+    """ Countdown and budget of the automatic retries of `BaseTaskContext.after_return`
+
+    The countdown grows exponentially with the retries of the task, `backoff * 2 ** retries` capped at
+    `backoff_max` seconds, and with `jitter` a random countdown between 0 and that value is used
+    ("full jitter"), so tasks failing together do not retry together.
+
+    `budgets` maps a task name or a queue name to a celery rate (eg: '30/m') or to (rate, capacity):
+    token buckets of retries. A retry needs a token from every bucket that applies, when one is empty
+    the task is not retried and fails as is. Buckets live in each worker process.
+    """
+
+    def __init__(self, backoff=60, backoff_max=30 * 60, jitter=True, budgets=None):
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+
+        self.budgets = TokenBuckets(budgets)
+
+    def countdown(self, retries):
+        delay = min(self.backoff_max, self.backoff * 2 ** min(retries, 32))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def acquire(self, *keys):
+        """ Take a retry token from the buckets of `keys`, False (and nothing taken) if one of them is empty """
+        return self.budgets.consume(*keys)
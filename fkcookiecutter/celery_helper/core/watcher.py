@@ -1,22 +1,49 @@
 import os
 import sys
-import json
 import logging
 import traceback
 from datetime import datetime, timedelta
 
-import requests
-
 from kombu import Exchange, Queue
 from celery import current_app
 from celery.worker.request import Request
 
+from .alerts import AlertDispatcher
 from .cached_property import cached_property
 
 
 class WatcherConfig:
     TASK_TIME_LIMIT = 60    # 任务执行的最大运行时间
 
+    # 钉钉告警: 异步发送, 同一任务同一异常类型在 ALERT_DEDUPE_WINDOW 秒内只发一次, 重复的合并为一条汇总
+    ALERT_QUEUE_SIZE = int(os.environ.get('DD_ROBOT_ALERT_QUEUE_SIZE', 1000))
+    ALERT_FLUSH_INTERVAL = float(os.environ.get('DD_ROBOT_ALERT_FLUSH_INTERVAL', 5))
+    ALERT_DEDUPE_WINDOW = float(os.environ.get('DD_ROBOT_ALERT_DEDUPE_WINDOW', 300))
+    ALERT_RATE_LIMIT = os.environ.get('DD_ROBOT_ALERT_RATE_LIMIT', '20/m')
+    ALERT_TIMEOUT = (3, 10)  # (connect, read) seconds
+
+
+def _dd_robot_api_path():
+    return '{host}/{api}'.format(
+        host=os.environ.get('DD_ROBOT_WEBHOOK_HOST'),
+        api=os.environ.get('DD_ROBOT_WEBHOOK_API'),
+    )
+
+
+def _dd_robot_digest(data, count, window):
+    return dict(
+        data, title='%s [%s次]' % (data['title'], count),
+        error_msg='最近%d秒内重复%s次, 首次: %s' % (window, count, data['error_msg']),
+    )
+
+
+alert_dispatcher = AlertDispatcher(
+    _dd_robot_api_path,
+    maxsize=WatcherConfig.ALERT_QUEUE_SIZE, flush_interval=WatcherConfig.ALERT_FLUSH_INTERVAL,
+    dedupe_window=WatcherConfig.ALERT_DEDUPE_WINDOW, rate=WatcherConfig.ALERT_RATE_LIMIT,
+    timeout=WatcherConfig.ALERT_TIMEOUT, digest=_dd_robot_digest,
+)
+
 
 class TaskWatcher:
     _task = None
@@ -108,15 +135,13 @@ class TaskWatcher:
     def send_dd_robot(
             title, task_name,
             app_name=None, run_time=None, error_msg=None,
-            error_detail=None, push_id=1000, error_url=None
+            error_detail=None, push_id=1000, error_url=None, fingerprint=None
     ):
-        logging.warning('TaskWatcher.send_dd_robot: => vars: %s', vars())
+        """ Queue a DingTalk robot alert, sent by `alert_dispatcher` from its own thread (never blocks).
 
-        headers = {'Content-Type': 'application/json'}
-        api_path = '{host}/{api}'.format(
-            host=os.environ.get('DD_ROBOT_WEBHOOK_HOST'),
-            api=os.environ.get('DD_ROBOT_WEBHOOK_API'),
-        )
+        :param fingerprint: alerts with the same fingerprint are de-duplicated, default: (title, exception type)
+        """
+        logging.warning('TaskWatcher.send_dd_robot: => title: %s, task_name: %s, error_msg: %s', title, task_name, error_msg)
 
         try:
             etype, value, tb = sys.exc_info()
@@ -134,7 +159,8 @@ class TaskWatcher:
                 secret=os.environ.get('DD_ROBOT_WEBHOOK_SECRET'),
             )
 
-            requests.post(api_path, data=json.dumps(data), headers=headers)
+            fingerprint = fingerprint or (title, etype and etype.__name__)
+            alert_dispatcher.submit(data, fingerprint)
         except Exception as e:
             logging.error(traceback.format_exc())
 
@@ -1,4 +1,3 @@
-import re
 import os
 import time
 import logging
@@ -7,19 +6,26 @@ import traceback
 from datetime import datetime
 from urllib.parse import unquote, urlparse
 
-from celery import Celery
 from celery import version_info as celery_version
-from celery.app import backends
 from celery.app.task import Task
+from celery.exceptions import Ignore
 from celery.states import SUCCESS
-from celery.utils.time import timezone
+from celery.utils import uuid
+from celery.utils.functional import maybe_list
+from celery.utils.time import maybe_make_aware, timezone
 from celery.app.task import extract_exec_options
 from kombu import Queue
 
 from .amqp import Amqp
 from ..conf import CeleryConfig as Config
+from ..core.backends import ResultPolicyCelery, backend_registry
+from ..core.confirms import ChunkConfirms
+from ..core.events import TaskEventLogger
+from ..core.metrics import TaskLatency
+from ..core.retry import RetryPolicy
 from ..core.watcher import TaskWatcher
-from ..core.exceptions import CeleryVersionError
+from ..core.exceptions import BulkSendError, CeleryVersionError
+from ..core.idempotency import IdempotencyGuard
 
 __all__ = ["TaskContext", "TaskSender"]
 
@@ -27,9 +33,100 @@ __all__ = ["TaskContext", "TaskSender"]
 task_logger = logging.getLogger("celery.task")
 worker_logger = logging.getLogger("celery.worker")
 
+# Structured events of the task hooks (on_success, on_retry, on_failure, after_return, __call__)
+task_events = TaskEventLogger(worker_logger, sample_rate=Config.CELERY_TASK_EVENT_SAMPLE_RATE)
+
+# Run time, queue wait and end-to-end latency histograms per task of this worker process
+task_latency = TaskLatency(worker_logger, export_interval=Config.CELERY_TASK_LATENCY_EXPORT_INTERVAL)
+
+# Backoff and budget of the retries of `BaseTaskContext.after_return`
+retry_policy = RetryPolicy(
+    backoff=Config.CELERY_TASK_RETRY_BACKOFF, backoff_max=Config.CELERY_TASK_RETRY_BACKOFF_MAX,
+    jitter=Config.CELERY_TASK_RETRY_JITTER, budgets=Config.CELERY_TASK_RETRY_BUDGETS,
+)
+
+# Duplicate suppression of idempotent tasks, see `BaseTaskContext._acquire_idempotency`
+idempotency_guard = IdempotencyGuard(
+    Config.CELERY_TASK_IDEMPOTENCY_REDIS_URL,
+    ttl=Config.CELERY_TASK_IDEMPOTENCY_TTL, lease_ttl=Config.CELERY_TASK_IDEMPOTENCY_LEASE_TTL,
+)
+
 empty = object()
 
 
+class TaskMeta:
+    """ Signature-derived metadata of a task class, computed once per class (see `BaseTaskContext.task_meta`) """
+    __slots__ = (
+        "is_bound", "signatures", "backend_name", "backend_url", "backend_attr", "retry_managed", "fire_and_forget",
+        "idempotent", "idempotency_key",
+    )
+
+    def __init__(self, run, is_bound, backend_keyword, retry_managed=False):
+        self.is_bound = is_bound
+        self.retry_managed = retry_managed
+
+        signature = inspect.signature(run)
+        params = list(signature.parameters.items())
+        if is_bound and not inspect.ismethod(run):
+            params = params[1:]  # `self` of a `bind=True` task function read from the class
+
+        signatures = dict(is_instance=is_bound)
+        for name, param in params:
+            default = param.default
+            signatures.setdefault(name, dict(
+                kind=param.kind.__str__(),
+                default=default is inspect.Parameter.empty and empty or default
+            ))
+        self.signatures = signatures
+
+        # `def my_task(...) -> None:` returns nothing worth storing
+        self.fire_and_forget = signature.return_annotation in (None, "None")
+
+        # eg: to_backend="redis" (a name of `CELERY_TASK_BACKENDS`) or to_backend="redis://:@127.0.0.1:6379/0"
+        to_backend = signatures.get(backend_keyword, {}).get("default", empty)
+        self.backend_name = self.backend_url = self.backend_attr = None
+
+        if to_backend and to_backend is not empty:
+            if '://' in to_backend:
+                self.backend_url, self.backend_name = to_backend, to_backend.split('://')[0]
+            else:
+                self.backend_name = to_backend
+            self.backend_attr = "CELERY_TASK_BACKEND_%s" % self.backend_name.replace('-', '_').upper()
+
+    @classmethod
+    def from_task_class(cls, task_cls):
+        run = inspect.getattr_static(task_cls, "run")
+        is_bound = not isinstance(run, staticmethod)
+        run = task_cls.run
+
+        meta = cls(run, is_bound, task_cls.TASK_BACKEND_KEYWORD_NAME, cls.is_retry_managed(task_cls, run, is_bound))
+
+        # `idempotency_key` task option is a plain function of the task arguments, not a method
+        key_func = inspect.getattr_static(task_cls, "idempotency_key", None)
+        meta.idempotency_key = getattr(key_func, "__func__", key_func)
+        meta.idempotent = bool(getattr(task_cls, "idempotent", False) or meta.idempotency_key)
+        return meta
+
+    @staticmethod
+    def is_retry_managed(task_cls, run, is_bound):
+        """ Whether the task handles its own retries, so `after_return` must not retry it:
+
+            - `retry_managed` task option, eg: @celery_app.task(retry_managed=True), which wins over the rest
+            - `autoretry_for` task option
+            - `max_retries` task option, given to this task class
+            - `bind=True` task function that calls `self.retry`, read from the compiled code, not the source
+        """
+        retry_managed = task_cls.__dict__.get("retry_managed")
+        if retry_managed is not None:
+            return bool(retry_managed)
+
+        if getattr(task_cls, "autoretry_for", None) or "max_retries" in task_cls.__dict__:
+            return True
+
+        code = getattr(inspect.unwrap(run), "__code__", None)
+        return bool(is_bound and code is not None and "retry" in code.co_names)
+
+
 if celery_version < (5, 2, 7):
     raise CeleryVersionError('Celery version must be equal or greater than 5.2.7')
 
@@ -41,56 +138,66 @@ class BaseTaskContext(Task):
     # The keyword of the task function argument to try the maximum number of deliveries
     DEFAULT_RETRY_KEYWORD = "max_retry_cnt"
 
-    # The task of consuming failure, delay time for the next extended execution
+    # The task of consuming failure, delay time for the next extended execution.
+    # Not used by `after_return` any more: the countdown backs off, see `CELERY_TASK_RETRY_BACKOFF`
     DEFAULT_RETRY_COUNTDOWN = 1 * 60
 
     # parameter name of each task to store backend
     TASK_BACKEND_KEYWORD_NAME = "to_backend"
 
+    # Result policy defaults of every task, overridden by task options, eg: @celery_app.task(result_expires=600).
+    # See `core.results.ResultPolicy`, `result_expires` None is the `CELERY_RESULT_EXPIRES` config
+    result_compress_threshold = Config.CELERY_RESULT_COMPRESS_THRESHOLD
+    result_max_size = Config.CELERY_RESULT_MAX_SIZE
+
+    # Opt-in duplicate suppression, eg: @celery_app.task(idempotent=True) keys by the task arguments,
+    # @celery_app.task(idempotency_key=lambda order_id, **kw: order_id) by a function of them.
+    # A message may also carry its own key: my_task.apply_async(kwargs, idempotency_key="order-42")
+    idempotent = False
+    idempotency_key = None
+
+    # Message header of the explicit idempotency key
+    IDEMPOTENCY_HEADER = "idempotency_key"
+
+    # Message header: wall clock nanoseconds when the message was sent, for the queue wait latency
+    LATENCY_SENT_HEADER = "sent_ns"
+
+    # `apply_async` options that are arguments of the message itself (`create_task_message`), see `send_many`
+    BULK_MESSAGE_OPTIONS = ("countdown", "eta", "expires", "time_limit", "soft_time_limit", "shadow", "root_id", "parent_id")
+
     @property
     def backend(self):
         """ Default backend: self.app.backend (celery.app.base:Celery.backend)
          The execution results of tasks is stored to different backends, eg:
             celery.app.backends: BACKEND_ALIASES, flask-db, redis etc.
+
+         `to_backend` is read from the task signature once per task class (see `TaskMeta`),
+         so this is a couple of dictionary lookups per read.
         """
-        native_signatures = self.get_native_task_signatures()
-        backend_param = native_signatures.get(self.TASK_BACKEND_KEYWORD_NAME, {})
-        to_backend = backend_param.get("default", empty)
+        meta = self.task_meta
 
-        if to_backend and to_backend is not empty:
+        if meta.backend_name is not None:
             # If task func has its own `TASK_BACKEND_KEYWORD_NAME`(default: 'to_backend') config,
             # the execution results of the task will be stored in the corresponding backend,
-            # Instead of Celery default configuration backend(`CELERY_RESULT_BACKEND` config).
-            if '://' in to_backend:
-                backend_url = to_backend  # eg: redis://:@127.0.0.1:6379/0
-                backend_name = to_backend.split('://')[0]
-            else:
-                backend_url, backend_name = None, to_backend
-
-            task_backend_name = "CELERY_TASK_BACKEND_%s" % backend_name.replace('-', '_').upper()
-            new_backend = getattr(self, task_backend_name, None)
-
+            # Instead of Celery default configuration backend(`CELERY_TASK_BACKEND` config).
+            # Task class may set its own backend instance as `CELERY_TASK_BACKEND_<NAME>` attribute
+            new_backend = getattr(self, meta.backend_attr, None)
             if new_backend:
                 return new_backend
 
-            if backend_url is None:
-                backend_url = Config.CELERY_TASK_BACKENDS.get(backend_name)
-
+            backend_url = meta.backend_url or Config.CELERY_TASK_BACKENDS.get(meta.backend_name)
             assert backend_url, "task %s `to_backend` parameter not provide." % self.name
 
-            backend_cls, url = backends.by_url(backend_url, self.app.loader)
-            new_backend = backend_cls(app=self.app, url=url)
-            setattr(self, task_backend_name, new_backend)
+            # Shared by all tasks (in this process) with the same backend url, see `BackendRegistry`
+            return backend_registry.get(self.app, backend_url)
 
-            return new_backend
+        # As with native celery, depends on `CELERY_RESULT_BACKEND` config. `self.app.backend` is thread-local,
+        # the result policies of tasks are applied by its class, see `ResultPolicyCelery`
+        backend = self._backend
+        if backend is None:
+            return self.app.backend
 
-        else:
-            # As with native celery, depends on `CELERY_RESULT_BACKEND` config
-            backend = self._backend
-            if backend is None:
-                return self.app.backend
-
-            return backend
+        return backend
 
     @backend.setter
     def backend(self, value):  # noqa
@@ -98,23 +205,31 @@ class BaseTaskContext(Task):
         worker_logger.info("ContextTask.backend -> Set value: %s", value)
 
     def log_info(self, log_kwargs, current_running_fun=None):
-        if self is empty:
-            worker_logger.info(">>>>>> ContextTask.log have't bond task instance !!!")
+        """ Log `log_kwargs` as an event of hook `current_running_fun`, nothing is formatted if INFO is disabled """
+        if not task_events.enabled(log_kwargs.get("task_id")):
+            return
 
         log_kwargs.pop("self", None)
         log_kwargs["self_id"] = id(self)
-        log_msg = log_kwargs.pop("log_msg", "")
-        task_cls_name = self.app.task_cls.__name__
-
-        log_msg = "{task_cls_name}.{current_running_fun} {log_msg} -> {running_fun_kwargs}".format(
-            task_cls_name=task_cls_name, log_msg=log_msg,
-            current_running_fun=current_running_fun, running_fun_kwargs=log_kwargs
-        )
-        worker_logger.info(log_msg)
+        task_events.emit(self, current_running_fun, log_kwargs)
 
     @classmethod
     def on_bound(cls, app):
         worker_logger.info("ContextTask.on_bound -> app: %s, cls<%s>: %s", app, id(cls), cls)
+        cls._task_meta = meta = TaskMeta.from_task_class(cls)
+
+        if meta.fire_and_forget and "ignore_result" not in cls.__dict__:
+            cls.ignore_result = True
+
+    @property
+    def task_meta(self):
+        """ `TaskMeta` of this task class, built on bind, or here for a class that was never bound """
+        task_cls = type(self)
+        meta = task_cls.__dict__.get("_task_meta")
+
+        if meta is None:
+            meta = task_cls._task_meta = TaskMeta.from_task_class(task_cls)
+        return meta
 
     def before_start(self, task_id, args, kwargs):
         """Handler called before the task starts(version 5.2).
@@ -123,21 +238,54 @@ class BaseTaskContext(Task):
             None: The return value of this handler is ignored.
         """
         kwargs['req_timestramp'] = int(time.time())
+
+        if Config.CELERY_TASK_LATENCY:
+            self._start_latency()
         return super().before_start(task_id, args, kwargs)
 
+    def _start_latency(self):
+        request = self.request
+        sent_ns = getattr(request, self.LATENCY_SENT_HEADER, None)
+
+        # Queue wait is wall clock, from the sender to this worker. Messages with an eta (countdown, retries)
+        # wait on purpose, they are left out
+        queue_wait = None
+        if sent_ns and not request.eta:
+            queue_wait = max(time.time_ns() - sent_ns, 0)
+            task_latency.record(self.name, "queue_wait", queue_wait)
+
+        request.latency_started = (time.perf_counter_ns(), queue_wait)
+
+    def _finish_latency(self):
+        started = getattr(self.request, "latency_started", None)
+        if started is None:
+            return
+
+        started_ns, queue_wait = started
+        run = time.perf_counter_ns() - started_ns
+        task_latency.record(self.name, "run", run)
+        if queue_wait is not None:
+            task_latency.record(self.name, "end_to_end", queue_wait + run)
+
     def on_success(self, retval, task_id, args, kwargs):
         """ Success handler. Run by the worker if the task executes successfully """
-        log_kwargs = dict(locals(), requestId=self.request.id, delivery_info=self.request.delivery_info)
-        self.log_info(current_running_fun=inspect.stack()[0][3], log_kwargs=log_kwargs)
+        if task_events.enabled(task_id):
+            task_events.emit(self, "on_success", dict(
+                task_id=task_id, retval=retval, args=args, kwargs=kwargs,
+                delivery_info=self.request.delivery_info,
+            ))
 
     def on_retry(self, exc, task_id, args, kwargs, einfo):
         """ Retry handler. This is run by the worker when the task is to be retried. """
-        self.log_info(current_running_fun=inspect.stack()[0][3], log_kwargs=dict(locals()))
+        self._release_idempotency(succeeded=False)
+        if task_events.enabled(task_id, logging.WARNING):
+            task_events.emit(self, "on_retry", dict(task_id=task_id, exc=exc, args=args, kwargs=kwargs), logging.WARNING)
         super().on_retry(exc, task_id, args, kwargs, einfo)
 
     def on_failure(self, exc, task_id, args, kwargs, einfo):
         """ Error handler. This is run by the worker when the task fails. """
-        self.log_info(current_running_fun=inspect.stack()[0][3], log_kwargs=dict(locals()))
+        if task_events.enabled(task_id, logging.ERROR):
+            task_events.emit(self, "on_failure", dict(task_id=task_id, exc=exc, args=args, kwargs=kwargs), logging.ERROR)
 
         # The temporary monitoring task is abnormal
         if os.environ.get('CELERY_TASK_FAILURE_NOTICE', True):
@@ -152,23 +300,27 @@ class BaseTaskContext(Task):
                 task_name=f'{task_name}<task_id: {task_id}>',
                 run_time=run_time.strftime('%Y-%m-%d %H:%M:%S'),
                 error_msg=str(exc), error_detail=einfo.traceback,
+                fingerprint=(task_name, type(exc).__name__),
             )
 
     def after_return(self, status, retval, task_id, args, kwargs, einfo):
         """ Handler called after the task returns.
             The status is not IGNORED, RETRY, REJECTED, after_return method will execute
         """
-        log_kwargs = dict(locals(), requestId=self.request.id)
-        current_running_fun = inspect.stack()[0][3]
-        self.log_info(current_running_fun=current_running_fun, log_kwargs=log_kwargs)
+        # Before any retry is sent, so the retry is not taken for a duplicate
+        self._release_idempotency(succeeded=status == SUCCESS)
+
+        log_enabled = task_events.enabled(task_id)
+        if log_enabled:
+            task_events.emit(self, "after_return", dict(task_id=task_id, status=status, retval=retval))
 
         # self is bound task, the detail task instance is unique.
         # Each asynchronous task will have only one instance, because id(self) value is unique.
         # If message consumption fails, the message needs to be pushed back to the RabbitMQ queue
         # Note that: the best approach is not to ack messages if they fail and stay it in RabbitMQ.
         if status != SUCCESS:
-            retry_log_kwargs = dict(Retry=True, args=args, kwargs=kwargs, task_id=task_id)
-            self.log_info(current_running_fun=current_running_fun, log_kwargs=retry_log_kwargs)
+            if log_enabled:
+                task_events.emit(self, "after_return", dict(task_id=task_id, retry=True, args=args, kwargs=kwargs))
 
             # The maximum number of attempts is 3 times by default
             # First method: Use the apply_async method to push the message into RabbitMQ again, It costs extra time.
@@ -183,23 +335,31 @@ class BaseTaskContext(Task):
                 default_max_retries = kwargs.get(self.DEFAULT_RETRY_KEYWORD, self.DEFAULT_MAX_RETRIES)
                 current_max_retries = default_max_retries - 1
 
-                max_retry_log_args = (self, id(self), current_max_retries)
-                worker_logger.info("after_return.task: %s<%s>, current_max_retries:%s", *max_retry_log_args)
+                worker_logger.info("after_return.task: %s<%s>, current_max_retries:%s", self, id(self), current_max_retries)
 
                 if current_max_retries > 0:
-                    kwargs[self.DEFAULT_RETRY_KEYWORD] = current_max_retries
-
-                    # the `retries` parameter of `self.apply` method indicates the number of retry times,
-                    # the same as Task.max_retries class property.
-                    # self.apply_async(args, kwargs, task_id=task_id, countdown=self.DEFAULT_RETRY_COUNTDOWN)
-                    self.retry(exc=einfo, countdown=self.DEFAULT_RETRY_COUNTDOWN)
+                    if not retry_policy.acquire(self.name, self._retry_queue()):
+                        # Retry budget of the task or its queue is spent, the task fails as is
+                        if task_events.enabled(task_id, logging.WARNING):
+                            task_events.emit(self, "after_return", dict(
+                                task_id=task_id, retry=False, reason="retry budget exhausted",
+                            ), logging.WARNING)
+                    else:
+                        kwargs[self.DEFAULT_RETRY_KEYWORD] = current_max_retries
+
+                        # the `retries` parameter of `self.apply` method indicates the number of retry times,
+                        # the same as Task.max_retries class property.
+                        # self.apply_async(args, kwargs, task_id=task_id, countdown=self.DEFAULT_RETRY_COUNTDOWN)
+                        self.retry(exc=einfo, countdown=retry_policy.countdown(self.request.retries or 0))
 
         # Task Cost Time
-        cost_log_kwargs = dict(
-            task_id=task_id, status=status, retval=retval,
-            cost_time=time.time() - kwargs['req_timestramp'],
-        )
-        self.log_info(current_running_fun=current_running_fun, log_kwargs=cost_log_kwargs)
+        if log_enabled:
+            task_events.emit(self, "after_return", dict(
+                task_id=task_id, status=status, cost_time=time.time() - kwargs['req_timestramp'],
+            ))
+
+        if Config.CELERY_TASK_LATENCY:
+            self._finish_latency()
 
         # Monitor for async, avoid to degrade performance
         if self.app.conf.CELERY_TASK_WATCHER:
@@ -207,8 +367,6 @@ class BaseTaskContext(Task):
 
     def run(self, *args, **kwargs):
         """ The body of the task executed by workers."""
-        self.log_info(current_running_fun=inspect.stack()[0][3], log_kwargs=dict(locals()))
-
         raise NotImplementedError('BaseJobTask must define the run method.')
 
     def __call__(self, *args, **kwargs):
@@ -234,17 +392,62 @@ class BaseTaskContext(Task):
                 #     return orig(self, *args, **kwargs)
                 # BaseTask.__call__ = __protected_call__
         """
+        if not self.request.called_directly:
+            self._acquire_idempotency(args, kwargs)
+
         retval = super().__call__(*args, **kwargs)
 
-        task_id = request_id = self.request.id  # request_id is id of task
-        log_kwargs = dict(
-            log_msg="Task Call Finish", args=args, kwargs=kwargs, task_id=task_id,
-            request_id=request_id, self=self, reqId=id(self.request), retval=retval,
-        )
-        self.log_info(current_running_fun=inspect.stack()[0][3], log_kwargs=log_kwargs)
+        task_id = self.request.id  # request_id is id of task
+        if task_events.enabled(task_id):
+            task_events.emit(self, "__call__", dict(
+                log_msg="Task Call Finish", task_id=task_id, args=args, kwargs=kwargs, retval=retval,
+            ))
 
         return retval
 
+    def _acquire_idempotency(self, args, kwargs):
+        """ Raise `Ignore` (the message is acked, nothing runs nor is stored) if an execution with the same
+            idempotency key is running or succeeded within `CELERY_TASK_IDEMPOTENCY_TTL`
+        """
+        request = self.request
+        explicit_key = getattr(request, self.IDEMPOTENCY_HEADER, None)
+        meta = self.task_meta
+
+        if explicit_key is None and not meta.idempotent:
+            return
+
+        # Without the kwargs this class adds: they change between deliveries of the same message
+        kwargs = {k: v for k, v in kwargs.items() if k not in ("req_timestramp", self.DEFAULT_RETRY_KEYWORD)}
+        key = idempotency_guard.key_for(self.name, args, kwargs, key=explicit_key, key_func=meta.idempotency_key)
+
+        if not idempotency_guard.acquire(key, request.id):
+            if task_events.enabled(request.id, logging.WARNING):
+                task_events.emit(self, "__call__", dict(task_id=request.id, duplicate=key), logging.WARNING)
+            raise Ignore()
+
+        request.idempotency_lease = (key, request.id)
+
+    def _release_idempotency(self, succeeded):
+        lease = getattr(self.request, "idempotency_lease", None)
+        if lease is None:
+            return
+
+        self.request.idempotency_lease = None
+        if succeeded:
+            idempotency_guard.done(*lease)
+        else:
+            idempotency_guard.release(*lease)
+
+    def _retry_queue(self):
+        """ Name of the queue the task was routed to, keys the per queue retry budget """
+        delivery_info = self.request.delivery_info or {}
+        queue = getattr(self, "queue", None) or delivery_info.get("routing_key")  # `queue` is an optional task option
+
+        if queue is None:
+            route = self.app.amqp.router.route({}, self.name)
+            queue = route.get("queue")
+        return getattr(queue, "name", queue)
+
     def _check_task_bound_autoretry(self):
         """ Whether a retry mechanism is bound when the task function is defined, example:
 
@@ -264,54 +467,18 @@ class BaseTaskContext(Task):
             >>> @celery_app.task(max_retries=5)
             ... def test_retry_message(self, *args, **kwargs):
             ...     pass
-        """
-        has_autoretry = False
-        task_retry_attr = "_TASK_AUTO_RETRY"
-        auto_task_retry = getattr(self, task_retry_attr, has_autoretry)
-
-        if auto_task_retry:
-            return auto_task_retry
-
-        source_code = inspect.getsource(self.run)
-
-        # 1. Match `@celery_app.task(bind=True)` pattern
-        retry_raise_pattern = r"^\s+?raise\s+.*?\.retry\(.*?\)"
-        task_bind_regex = re.compile(r"@.*?\.task\(.*?bind=True.*?\).*?def\s+.*?\(.*?\):", re.S | re.M)
-        task_bind_match = task_bind_regex.search(source_code)
-
-        if task_bind_match:
-            retry_raise_regex = re.compile(retry_raise_pattern, re.S | re.M)
-            retry_raise_match = retry_raise_regex.search(source_code)
-            has_autoretry = bool(retry_raise_match)
 
-        else:
-            # 2. Match `@celery_app.task(max_retries=5)` pattern
-            task_retry_regex = re.compile(r"@.*?\.task\(.*?max_retries=\d.*?\).*?def\s+.*?\(.*?\):", re.S | re.M)
-            task_retry_match = task_retry_regex.search(source_code)
-
-            has_autoretry = bool(task_retry_match)
+            >>> @celery_app.task(autoretry_for=(IOError,), retry_backoff=True)
+            ... def test_retry_message(*args, **kwargs):
+            ...     pass
 
-        setattr(self, task_retry_attr, has_autoretry)
-        return has_autoretry
+        Decided once per task class from the task options, see `TaskMeta.retry_managed`.
+        """
+        return self.task_meta.retry_managed
 
     def get_native_task_signatures(self):
-        """ Arguments to the asynchronous task native function. """
-        task_run = self.run  # be equal to self.__wrapped__
-        params = inspect.signature(task_run).parameters
-        native_signatures = dict(is_instance=self.is_bound_task())
-
-        for name, param in params.items():
-            kind = param.kind
-            default = param.default
-            native_signatures.setdefault(
-                name,
-                dict(
-                    kind=kind.__str__(),
-                    default=default is inspect.Parameter.empty and empty or default
-                )
-            )
-
-        return native_signatures
+        """ Arguments to the asynchronous task native function, cached per task class (read only). """
+        return self.task_meta.signatures
 
     def is_bound_task(self):
         """
@@ -327,7 +494,7 @@ class BaseTaskContext(Task):
 
                  If bind set to false, The self only access the attributes of `Task` class.
         """
-        return inspect.ismethod(self.run)
+        return self.task_meta.is_bound
 
 
 class TaskContext(BaseTaskContext):
@@ -352,6 +519,14 @@ class TaskContext(BaseTaskContext):
             That is, the task will be executed locally instead of being sent to the queue.
         """
         celery_app = self.app  # self.app and self._get_app() are the same instance of celery_app
+
+        idempotency_key = options.pop("idempotency_key", None)
+        if idempotency_key is not None:
+            options["headers"] = dict(options.get("headers") or {}, **{self.IDEMPOTENCY_HEADER: idempotency_key})
+
+        if Config.CELERY_TASK_LATENCY:
+            options["headers"] = dict(options.get("headers") or {}, **{self.LATENCY_SENT_HEADER: time.time_ns()})
+
         opts = dict(
             args=args, kwargs=kwargs, task_id=task_id, producer=producer,
             link=link, link_error=link_error, shadow=shadow, **options
@@ -378,11 +553,128 @@ class TaskContext(BaseTaskContext):
                 title=f'Celery任务<{self.name.split(".")[-1]}>消息推送失败',
                 task_name=f'{self.name}',
                 run_time=datetime.now(tz=tz).strftime('%Y-%m-%d %H:%M:%S'),
-                error_msg=traceback.format_exc()
+                error_msg=traceback.format_exc(),
+                fingerprint=(self.name, type(e).__name__, 'apply_async'),
             )
 
             raise e
 
+    def send_many(self, items, chunk_size=500, producer=None, results=False, **options):
+        """ Publish one message per item of `items` with one producer.
+
+            >>> ids = my_task.send_many((uid,) for uid in uids)
+            >>> ids = my_task.send_many(({'task_uid': uid} for uid in uids), queue='bulk_q')
+
+        An item is a tuple (list) of positional arguments, or a dict of keyword arguments, `options` are the
+        `apply_async` options of every message, resolved once (task routes are still applied per message).
+        `items` is consumed in chunks of `chunk_size` and nothing is logged per message. Messages are
+        published with `producer`, else with one of the app producer pool.
+
+        The task ids are returned (str). With `results` the `AsyncResult` of every message is returned instead,
+        and the result backend is told about each task (`on_task_call`), as `apply_async` does.
+
+        With publisher confirms (`broker_transport_options={'confirm_publish': True}` on RabbitMQ) the messages are
+        published over a connection of their own and the broker acks are waited for once per chunk, not once per
+        message (see `ChunkConfirms`); the next chunk is published only once the previous one was confirmed.
+        On failure `BulkSendError.sent` holds the ids of the messages published (confirmed) before.
+        """
+        options = self._bulk_options(options)
+        sent = []
+
+        connection = ChunkConfirms.connection_for(self.app)
+        if connection is None:
+            with self.app.producer_or_acquire(producer) as P:
+                self._send_chunks(P, None, items, chunk_size, sent, options, results)
+        else:
+            with connection:
+                channel = connection.channel()
+                try:
+                    confirms = ChunkConfirms(
+                        channel, timeout=(self.app.conf.broker_transport_options or {}).get("confirm_timeout"),
+                    )
+                    P = self.app.amqp.Producer(channel, auto_declare=False)
+                    self._send_chunks(P, confirms, items, chunk_size, sent, options, results)
+                finally:
+                    channel.close()
+
+        task_logger.info("ContextTask.send_many <%s> sent %s messages", self.name, len(sent))
+        return [self.AsyncResult(task_id) for task_id in sent] if results else sent
+
+    def _bulk_options(self, options):
+        """ The `apply_async` options of `send_many`, resolved once as `Celery.send_task` does per message """
+        options = dict(self._get_exec_options(), **options)
+        options.setdefault("ignore_result", self.ignore_result)
+        if self.priority:
+            options.setdefault("priority", self.priority)
+
+        expires = options.get("expires")
+        if expires is not None:
+            if isinstance(expires, datetime):
+                expires = (maybe_make_aware(expires) - self.app.now()).total_seconds()
+            options["expiration"] = max(expires, 0)
+
+        parent = self.app.current_worker_task
+        if parent:
+            options.setdefault("root_id", parent.request.root_id or parent.request.id)
+            options.setdefault("parent_id", parent.request.id)
+            if self.app.conf.task_inherit_parent_priority:
+                options.setdefault("priority", parent.request.delivery_info.get("priority"))
+
+        # Arguments of the message itself (`create_task_message`), the rest are publish options
+        message_options = {key: options.pop(key, None) for key in self.BULK_MESSAGE_OPTIONS}
+        message_options.update(
+            callbacks=maybe_list(options.pop("link", None)), errbacks=maybe_list(options.pop("link_error", None)),
+            ignore_result=options.pop("ignore_result"), reply_to=self.app.thread_oid,
+            create_sent_event=self.app.conf.task_send_sent_event,
+        )
+        return message_options, options
+
+    def _send_chunks(self, producer, confirms, items, chunk_size, sent, options, results):
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                self._send_chunk(producer, confirms, chunk, sent, options, results)
+                chunk = []
+
+        if chunk:
+            self._send_chunk(producer, confirms, chunk, sent, options, results)
+
+    def _send_chunk(self, producer, confirms, chunk, sent, options, results):
+        message_options, publish_options = options
+        if Config.CELERY_TASK_LATENCY:
+            # One timestamp per chunk, publishing a chunk takes milliseconds
+            headers = dict(publish_options.get("headers") or {}, **{self.LATENCY_SENT_HEADER: time.time_ns()})
+            publish_options = dict(publish_options, headers=headers)
+
+        amqp, router, backend = self.app.amqp, self.app.amqp.router, self.backend
+        on_task_call = results and not message_options["ignore_result"]
+
+        published = []
+        try:
+            for item in chunk:
+                task_id = uuid()
+                args, kwargs = (None, item) if isinstance(item, dict) else (item, None)
+
+                route = router.route(dict(publish_options), self.name, args, kwargs, self)
+                message = amqp.create_task_message(task_id, self.name, args, kwargs, **message_options)
+                if on_task_call:
+                    backend.on_task_call(producer, task_id)
+                amqp.send_task_message(producer, self.name, message, **route)
+
+                if confirms is not None:
+                    confirms.published()
+                published.append(task_id)
+
+            if confirms is not None:
+                confirms.wait()
+        except Exception as e:
+            if confirms is None:
+                sent.extend(published)
+            raise BulkSendError("send_many <%s> failed after %s messages: %r" % (self.name, len(sent), e), sent) from e
+
+        sent.extend(published)
+
 
 class NativeTaskSender:
     """ Sending native message """
@@ -406,7 +698,7 @@ class NativeTaskSender:
         if _raw_app:
             return _raw_app
 
-        _raw_app = Celery(
+        _raw_app = ResultPolicyCelery(
             main="%sRawApp" % self.pure_virtual_host.title().replace('_', ''),
             amqp=getattr(Config, Config.CELERY_NATIVE_AMQP, Amqp),
             broker=self.broker_url, task_cls=self.task_cls, config_source=self.config_source
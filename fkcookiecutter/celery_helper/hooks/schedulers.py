@@ -29,6 +29,9 @@ class DatabaseScheduler(_DatabaseScheduler):
         logger.info("[%s] >>> task: %s, default broker: %s", *log_args)
 
         try:
+            if self.held_back(entry):
+                return None
+
             entry_args = _evaluate_entry_args(entry.args)
             entry_kwargs = _evaluate_entry_kwargs(entry.kwargs)
 
@@ -54,13 +57,16 @@ class DatabaseScheduler(_DatabaseScheduler):
 
             # native app to send message
             if task:
-                return task.apply_async(entry_args, entry_kwargs,
+                result = task.apply_async(entry_args, entry_kwargs,
+                                          producer=producer,
+                                          **entry.options)
+            else:
+                result = self.send_task(entry.task, entry_args, entry_kwargs,
                                         producer=producer,
                                         **entry.options)
-            else:
-                return self.send_task(entry.task, entry_args, entry_kwargs,
-                                      producer=producer,
-                                      **entry.options)
+
+            self.record_dispatch(entry, result)
+            return result
         except Exception as exc:  # pylint: disable=broad-except
             reraise(
                 SchedulingError,
@@ -4,9 +4,13 @@ from celery.signals import celeryd_init
 from celery.signals import celeryd_after_setup
 from celery.signals import beat_init
 from celery.signals import task_internal_error
+from celery.signals import worker_process_shutdown
+from celery.utils.serialization import strtobool
+from celery.worker.control import inspect_command
 
 from ..conf import CeleryConfig
 from ..core.webapp import run_with_thread
+from .context import task_latency
 
 logger = logging.getLogger("celery.worker")
 
@@ -45,6 +49,21 @@ def bind_do_watch_task(sender, instance, conf, options, **kwargs):
     pass
 
 
+@worker_process_shutdown.connect
+def export_task_latency(**kwargs):
+    # The last interval of the histograms, before the pool process exits
+    if CeleryConfig.CELERY_TASK_LATENCY:
+        task_latency.export()
+
+
+@inspect_command(args=[('reset', strtobool)], signature='[reset=False]')
+def dump_task_latency(state, reset=False, **kwargs):
+    """ Latency summaries per task of the worker process answering the command (solo, threads, gevent pools).
+        Prefork pool processes export their own histograms to the log, see `CELERY_TASK_LATENCY_EXPORT_INTERVAL`
+    """
+    return task_latency.snapshot(reset=reset)
+
+
 def unregister_useless_tasks():
     """ Eliminate task of useless or not expected """
     from celery import current_app
@@ -0,0 +1,59 @@
+import os, sys
+
+pkg_path = os.path.dirname(os.path.dirname(__file__))
+sys.path.append(pkg_path)
+
+import gc
+import tracemalloc
+from datetime import datetime, timedelta
+
+from celery import schedules
+
+from fkcookiecutter.celery_helper.app import celery_app
+from fkcookiecutter.celery_helper.beat.models import PeriodicTask, PeriodicTaskRow
+from fkcookiecutter.celery_helper.beat.schedulers import ModelEntry
+
+# 调度条目内存基准: 对比 ORM 实例 (PeriodicTask) 与脱离 session 的紧凑行 (PeriodicTaskRow)
+# 每个条目占用的内存。不需要数据库, 所有条目共享同一个 schedule 对象 (同 DatabaseScheduler.all_as_schedule)。
+# 注意: ORM 实例这里是 transient 状态, 挂在 session 上时还要加上 identity map 的开销, 实际差距更大。
+# 用法: python tests/bench_model_entry.py [条目数量, 默认 100000]
+
+SCHEDULE = schedules.schedule(timedelta(seconds=30))
+
+
+def task_values(index):
+    return dict(
+        id=index, name=f'bench-task-{index}', task='tasks.bench', enabled=True, one_off=False,
+        start_time=None, last_run_at=datetime(2024, 1, 1), total_run_count=0,
+        queue='default', exchange=None, routing_key=None, priority=None, expires=None, expire_seconds=None,
+        args=[index], kwargs={'index': index}, headers={},
+        interval_id=1, crontab_id=None, solar_id=None, clocked_id=None,
+    )
+
+
+def make_row(index):
+    values = task_values(index)
+    return PeriodicTaskRow(*(values[field] for field in PeriodicTaskRow.__slots__))
+
+
+def make_model(index):
+    return PeriodicTask(**task_values(index))
+
+
+def measure(make, count):
+    gc.collect()
+    tracemalloc.start()
+    entries = [ModelEntry(make(index), app=celery_app, schedule=SCHEDULE) for index in range(count)]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert len(entries) == count
+    return current / count, peak / count
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    for label, make in (('orm PeriodicTask', make_model), ('PeriodicTaskRow', make_row)):
+        per_entry, peak_per_entry = measure(make, count)
+        print(f'{label:>18}: {count} entries, {per_entry:,.0f} B/entry (peak {peak_per_entry:,.0f} B/entry)')
@@ -5,7 +5,7 @@ sys.path.append(pkg_path)
 
 from fkcookiecutter.celery_helper.app import celery_app
 from fkcookiecutter.celery_helper.app import celery_app
-from fkcookiecutter.celery_helper.beat.utils import flask_app
+from fkcookiecutter.app import create_app
 
 # app.worker_main()
 
@@ -50,7 +50,8 @@ if __name__ == "__main__":
     /home/.virtualenv/fosun_circle_running/bin/celery -A config.celery beat -l info "
     """
 
-    with flask_app.app_context():
+    # 也可以用 `flask --app runserver beat -l DEBUG` 启动, 调度器运行在 create_app() 的应用上下文中
+    with create_app().app_context():
         celery_app.start(argv=["-A", "fkcookiecutter.celery_helper.app", "beat", "-l", "DEBUG"])
 
     # 启动方式二
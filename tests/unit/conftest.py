@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Before `config.settings` and the celery config are imported: a throwaway SQLite database
+os.environ.setdefault("APP_NAME", "fkcookiecutter")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "tests.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from fkcookiecutter.app import create_app  # noqa: E402
+from fkcookiecutter.core.extensions import db  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def flask_app():
+    app = create_app()
+    app.config.update(TESTING=True)
+
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def app_context(flask_app):
+    """ App context with empty tables, dropped again after the test """
+    with flask_app.app_context():
+        yield flask_app
+
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+
+
+@pytest.fixture
+def celery_app():
+    from fkcookiecutter.celery_helper.app import celery_app
+
+    return celery_app
+
+
+@pytest.fixture
+def bumps(monkeypatch):
+    """ Binds of the `PeriodicTasks.bump` calls made during the test """
+    from fkcookiecutter.celery_helper.beat.models import PeriodicTasks
+
+    calls = []
+    bump = PeriodicTasks.bump.__func__
+
+    def counting_bump(cls, bind=None):
+        calls.append(bind)
+        return bump(cls, bind)
+
+    monkeypatch.setattr(PeriodicTasks, "bump", classmethod(counting_bump))
+    return calls
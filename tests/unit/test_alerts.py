@@ -0,0 +1,97 @@
+import json
+import os
+
+import pytest
+
+from fkcookiecutter.celery_helper.core import alerts
+from fkcookiecutter.celery_helper.core.alerts import AlertDispatcher
+
+
+class StubSession:
+    def __init__(self):
+        self.posts = []
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.posts.append(json.loads(data))
+        return self
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(alerts.time, "monotonic", lambda: clock[0])
+    return clock
+
+
+def make_dispatcher(**kwargs):
+    kwargs.setdefault("rate", None)
+    dispatcher = AlertDispatcher(lambda: "http://alerts.test/robot", **kwargs)
+    dispatcher._session = StubSession()
+    return dispatcher
+
+
+def test_repeated_alerts_are_sent_once_per_window_then_as_a_digest(clock):
+    dispatcher = make_dispatcher(
+        dedupe_window=300, digest=lambda data, count, window: dict(data, title="%s x%s" % (data["title"], count)),
+    )
+    posts = dispatcher._session.posts
+
+    dispatcher._collect("charge:Timeout", {"title": "charge failed"})
+    dispatcher.flush()
+    assert posts == [{"title": "charge failed"}]
+
+    for _ in range(3):
+        dispatcher._collect("charge:Timeout", {"title": "charge failed"})
+    dispatcher._collect("refund:Timeout", {"title": "refund failed"})
+    clock[0] += 10
+    dispatcher.flush()
+    assert posts[1:] == [{"title": "refund failed"}]
+
+    clock[0] += 300
+    dispatcher.flush()
+    assert posts[2:] == [{"title": "charge failed x3"}]
+
+    # Quiet for a whole window: forgotten
+    clock[0] += 300
+    dispatcher.flush()
+    assert dispatcher._pending == {}
+
+
+def test_alerts_are_dropped_when_the_queue_is_full(monkeypatch):
+    dispatcher = make_dispatcher(maxsize=2)
+    monkeypatch.setattr(dispatcher, "_ensure_thread", lambda: None)
+
+    assert dispatcher.submit({"title": "1"}, "a")
+    assert dispatcher.submit({"title": "2"}, "b")
+    assert not dispatcher.submit({"title": "3"}, "c")
+    assert dispatcher.dropped == 1
+
+
+def test_close_sends_what_is_queued():
+    dispatcher = make_dispatcher(flush_interval=60)
+
+    dispatcher.submit({"title": "late"}, "late")
+    dispatcher.close(timeout=5)
+
+    assert dispatcher._session.posts == [{"title": "late"}]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_children_start_afresh(monkeypatch):
+    dispatcher = make_dispatcher(maxsize=2)
+    monkeypatch.setattr(dispatcher, "_ensure_thread", lambda: None)
+    dispatcher.submit({"title": "parent"}, "parent")
+    dispatcher._collect("parent", {"title": "parent"})
+
+    pid = os.fork()
+    if not pid:
+        fresh = (dispatcher._session is None and dispatcher._thread is None
+                 and dispatcher._queue.empty() and dispatcher._pending == {})
+        os._exit(0 if fresh else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert dispatcher._queue.qsize() == 1 and "parent" in dispatcher._pending
@@ -0,0 +1,36 @@
+import pytest
+
+from fkcookiecutter.celery_helper.beat.backpressure import RateLimiter
+
+
+def test_rate_limits_are_celery_rates():
+    limiter = RateLimiter({"per-minute": "10/m", "burst": ("5/s", 20), "per-second": 2})
+
+    assert limiter.buckets["per-minute"].fill_rate == pytest.approx(10 / 60)
+    assert limiter.buckets["per-minute"].capacity == 1
+    assert (limiter.buckets["burst"].fill_rate, limiter.buckets["burst"].capacity) == (5, 20)
+    assert limiter.buckets["per-second"].fill_rate == 2
+
+
+@pytest.mark.parametrize("limit", [0, "0", "0/m", None])
+def test_zero_rates_are_unlimited(limit):
+    limiter = RateLimiter({"task": limit})
+
+    assert limiter.buckets == {}
+    assert all(limiter.consume("task", "queue") for _ in range(100))
+
+
+@pytest.mark.parametrize("limit", ["ten/m", "10/m/s", ("10/m", "lots")])
+def test_bad_rate_limits_are_rejected(limit):
+    with pytest.raises(ValueError, match="task"):
+        RateLimiter({"task": limit})
+
+
+def test_consume_takes_a_token_from_every_bucket_or_none():
+    limiter = RateLimiter({"task": ("1/m", 2), "queue": "1/m"})
+
+    assert limiter.consume("task", "queue")
+    # The queue bucket is empty, the task keeps its token
+    assert not limiter.consume("task", "queue")
+    assert limiter.consume("task", "other")
+    assert not limiter.consume("task", "other")
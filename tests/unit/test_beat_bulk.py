@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from fkcookiecutter.celery_helper.beat.bulk import iter_task_records, import_task_records
+from fkcookiecutter.celery_helper.beat.models import CrontabSchedule, PeriodicTask, db
+
+RECORDS = [
+    {"name": "report", "task": "demo.report", "crontab": "0 3 * * *", "kwargs": {"kind": "daily"},
+     "expires": "2030-01-01T08:00:00+08:00"},
+    {"name": "sync", "task": "demo.sync", "interval": {"every": 5, "period": "minutes"}},
+]
+
+
+def run_import(records, **kwargs):
+    counts = import_task_records(enumerate(records, 1), db.session, **kwargs)
+    db.session.commit()
+    return counts
+
+
+def test_import_creates_with_one_bump(app_context, bumps):
+    assert run_import(RECORDS) == dict(created=2, updated=0, unchanged=0, deleted=0)
+
+    # New schedules are inserted by Core statements too: the import bumps once, not per row
+    assert len(bumps) == 1
+    assert CrontabSchedule.query.count() == 1
+    report = PeriodicTask.query.filter_by(name="report").one()
+    assert report.expires.isoformat() == "2030-01-01T00:00:00"  # aware values are stored as naive UTC
+
+
+def test_reimport_of_unchanged_tasks_writes_nothing(app_context, bumps):
+    run_import(RECORDS)
+    del bumps[:]
+
+    assert run_import(RECORDS) == dict(created=0, updated=0, unchanged=2, deleted=0)
+
+    exported = list(iter_task_records(db.session))
+    assert run_import(json.loads(json.dumps(exported))) == dict(created=0, updated=0, unchanged=2, deleted=0)
+    assert bumps == []
+
+
+def test_reimport_updates_changed_fields_only(app_context):
+    run_import(RECORDS)
+    changed = [dict(RECORDS[0], kwargs={"kind": "weekly"}), RECORDS[1]]
+
+    assert run_import(changed) == dict(created=0, updated=1, unchanged=1, deleted=0)
+    assert PeriodicTask.query.filter_by(name="report").one().kwargs == {"kind": "weekly"}
+
+
+def test_prune_keeps_celery_tasks(app_context):
+    run_import(RECORDS + [{"name": "celery.backend_cleanup", "task": "celery.backend_cleanup",
+                           "crontab": "0 4 * * *"}])
+
+    assert run_import(RECORDS[:1], prune=True)["deleted"] == 1
+    assert {task.name for task in PeriodicTask.query} == {"report", "celery.backend_cleanup"}
+
+
+def test_import_command_dry_run_rolls_back(app_context, tmp_path):
+    from fkcookiecutter.celery_helper.beat.commands import beat
+
+    source = tmp_path / "tasks.jsonl"
+    source.write_text("\n".join(json.dumps(record) for record in RECORDS))
+
+    result = app_context.test_cli_runner().invoke(beat, ["import", str(source), "--dry-run"])
+
+    assert result.exit_code == 0, result.output
+    assert "[dry run] 2 created" in result.output
+    assert PeriodicTask.query.count() == 0
@@ -0,0 +1,159 @@
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+from sqlalchemy import insert, update
+
+from fkcookiecutter.celery_helper.beat.forecast import forecast_load
+from fkcookiecutter.celery_helper.beat.models import (
+    ClockedSchedule, CrontabSchedule, IntervalSchedule, PeriodicTask, db,
+)
+from fkcookiecutter.celery_helper.beat.tzcrontab import TzAwareCrontab
+
+HOURS = 26
+
+CRONTABS = [
+    dict(minute="*/15"),
+    dict(minute="30", hour="2"),
+    dict(minute="45", hour="1,2"),
+    dict(minute="*/7", hour="1-3"),
+    dict(minute="0", hour="*/3"),
+    dict(minute="5", hour="1", day_of_week="sun"),
+    dict(minute="0", hour="0", day_of_month="1"),
+]
+
+
+def brute_force(start, minutes, tz, fields, app):
+    """ Minutes a beat ticking every minute runs the crontab at, asking `is_due` each tick """
+    schedule = TzAwareCrontab(tz=tz, app=app, **fields)
+    last_run_at = start - timedelta(minutes=1)
+    fires = []
+
+    for index in range(minutes):
+        now = start + timedelta(minutes=index)
+        schedule.nowfun = lambda now=now: now.astimezone(tz)
+        if schedule.is_due(last_run_at).is_due:
+            fires.append(index)
+            last_run_at = now
+    return fires
+
+
+def add_task(name, queue, **schedule):
+    db.session.add(PeriodicTask(name=name, task="demo." + name, queue=queue, args=[], kwargs={}, headers={}, **schedule))
+
+
+@pytest.mark.parametrize("tz_name, start", [
+    ("UTC", datetime(2026, 2, 27, tzinfo=timezone.utc)),
+    ("Asia/Shanghai", datetime(2026, 1, 1, tzinfo=timezone.utc)),
+    ("America/New_York", datetime(2026, 3, 8, 5, tzinfo=timezone.utc)),  # DST starts
+    ("America/New_York", datetime(2026, 11, 1, 4, tzinfo=timezone.utc)),  # DST ends
+    ("Europe/Berlin", datetime(2026, 3, 29, tzinfo=timezone.utc)),
+    ("Australia/Lord_Howe", datetime(2026, 10, 3, 14, tzinfo=timezone.utc)),  # 30 minutes DST
+])
+def test_crontab_forecast_matches_is_due(app_context, celery_app, tz_name, start):
+    for index, fields in enumerate(CRONTABS):
+        crontab = CrontabSchedule(timezone=tz_name, **fields)
+        db.session.add(crontab)
+        db.session.flush()
+        add_task("crontab-%s" % index, "queue-%s" % index, crontab_id=crontab.id)
+    db.session.commit()
+
+    forecast = forecast_load(hours=HOURS, start=start, app=celery_app)
+
+    for index, fields in enumerate(CRONTABS):
+        histogram = forecast.queues.get("queue-%s" % index, [])
+        expected = brute_force(start, HOURS * 60, ZoneInfo(tz_name), fields, celery_app)
+        assert [minute for minute, count in enumerate(histogram) if count] == expected, fields
+
+
+def test_clocked_forecast(app_context, celery_app):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    clocked_at = {
+        "future": start + timedelta(minutes=90),
+        "overdue": start - timedelta(hours=2),
+        "done": start - timedelta(hours=2),
+        "beyond": start + timedelta(hours=HOURS + 1),
+    }
+    for name, clocked_time in clocked_at.items():
+        clocked = ClockedSchedule(clocked_time=clocked_time.replace(tzinfo=None))
+        db.session.add(clocked)
+        db.session.flush()
+        add_task(name, name, clocked_id=clocked.id, one_off=True)
+    db.session.flush()
+
+    # `last_run_at` has a server default, only "done" ran
+    db.session.execute(update(PeriodicTask).values(last_run_at=None))
+    db.session.execute(
+        update(PeriodicTask).where(PeriodicTask.name == "done").values(last_run_at=start - timedelta(hours=1))
+    )
+    db.session.commit()
+
+    forecast = forecast_load(hours=HOURS, start=start, app=celery_app)
+
+    assert forecast.totals() == {"future": 1, "overdue": 1}
+    assert forecast.queues["future"][90] == 1
+    assert forecast.queues["overdue"][0] == 1
+
+
+INTERVALS = [(7, "seconds"), (10, "seconds"), (61, "seconds"), (90, "seconds"), (5, "minutes"), (3, "hours"), (1, "days")]
+
+
+def test_interval_forecast_matches_stepping(app_context, celery_app):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    hours = 4
+    rand = random.Random(7)
+    expected = Counter()
+
+    for index, (every, period) in enumerate(INTERVALS):
+        interval = IntervalSchedule(every=every, period=period)
+        db.session.add(interval)
+        db.session.flush()
+
+        for number in range(20):
+            last_run_at = start - timedelta(seconds=rand.uniform(0, 2 * 86400))
+            start_time = start + timedelta(seconds=rand.uniform(0, 3600)) if number % 4 == 0 else None
+            add_task("interval-%s-%s" % (index, number), "queue-%s" % index, interval_id=interval.id,
+                     last_run_at=last_run_at.replace(tzinfo=None), start_time=start_time)
+
+            run_every = timedelta(**{period: every})
+            fire_at = max(start, last_run_at + run_every, start_time or start)
+            while fire_at < start + timedelta(hours=hours):
+                expected["queue-%s" % index, (fire_at - start) // timedelta(minutes=1)] += 1
+                fire_at += run_every
+    db.session.commit()
+
+    forecast = forecast_load(hours=hours, start=start, app=celery_app)
+
+    histograms = {(queue, minute): count for queue, histogram in forecast.queues.items()
+                  for minute, count in enumerate(histogram) if count}
+    assert histograms == dict(expected)
+
+
+def test_interval_forecast_of_a_large_schedule(app_context, celery_app):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    rand = random.Random(7)
+
+    interval_ids = []
+    for every, period in [(every, "minutes") for every in (1, 5, 10, 15, 30)] + INTERVALS:
+        interval = IntervalSchedule(every=every, period=period)
+        db.session.add(interval)
+        db.session.flush()
+        interval_ids.append(interval.id)
+
+    db.session.execute(insert(PeriodicTask), [
+        dict(name="large-%s" % index, task="demo.large", queue="queue-%s" % (index % 10), args=[], kwargs={},
+             headers={}, interval_id=rand.choice(interval_ids),
+             last_run_at=(start - timedelta(seconds=rand.uniform(0, 86400))).replace(tzinfo=None))
+        for index in range(100000)
+    ])
+    db.session.commit()
+
+    began = time.perf_counter()
+    forecast = forecast_load(hours=24, start=start, app=celery_app)
+    elapsed = time.perf_counter() - began
+
+    assert len(forecast.queues) == 10
+    assert elapsed < 1, elapsed
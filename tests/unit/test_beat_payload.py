@@ -0,0 +1,53 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from fkcookiecutter.celery_helper.beat.models import IntervalSchedule, PayloadJSON, PeriodicTask, db
+from fkcookiecutter.celery_helper.beat.utils import get_payload_codec
+
+
+def test_payload_columns_use_the_payload_codec(app_context):
+    interval = IntervalSchedule(every=5, period=IntervalSchedule.MINUTES)
+    db.session.add(interval)
+    db.session.flush()
+
+    kwargs = {"at": datetime(2026, 1, 2, 3, 4, 5), "amount": Decimal("1.50")}
+    db.session.add(PeriodicTask(name="payload", task="demo.payload", interval_id=interval.id, args=[1], kwargs=kwargs))
+    db.session.commit()
+    db.session.expire_all()
+
+    task = PeriodicTask.query.filter_by(name="payload").one()
+    assert task.args == [1]
+    assert task.kwargs["at"] == datetime(2026, 1, 2, 3, 4, 5)
+    assert Decimal(task.kwargs["amount"]) == Decimal("1.50")
+    assert task.headers == {}
+
+
+def test_engine_keeps_its_json_codec(app_context):
+    assert db.engine.dialect._json_serializer is None
+    assert db.engine.dialect._json_deserializer is None
+
+
+PAYLOAD = {
+    "at": datetime(2026, 1, 2, 3, 4, 5),
+    "amount": Decimal("1.50"),
+    "blob": b"\x00raw",
+    "nested": [{"day": datetime(2026, 3, 29, 1, 30).date()}],
+}
+
+
+@pytest.mark.parametrize("writer,reader", [("json", "orjson"), ("orjson", "json"), ("orjson", "orjson")])
+def test_payloads_read_back_with_the_other_codec(writer, reader):
+    dumps = get_payload_codec(writer)[0]
+    loads = get_payload_codec(reader)[1]
+
+    assert loads(dumps(PAYLOAD)) == PAYLOAD
+
+
+def test_payloads_decoded_by_the_driver_keep_their_types(app_context):
+    # psycopg2 hands back the parsed JSON, with kombu's tags still in it
+    process = PayloadJSON().result_processor(db.engine.dialect, None)
+
+    assert process(json.loads(get_payload_codec("json")[0](PAYLOAD))) == PAYLOAD
@@ -0,0 +1,231 @@
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from celery.beat import Scheduler
+from celery.schedules import schedstate
+from sqlalchemy import Column, Integer, MetaData, Table
+
+from fkcookiecutter.celery_helper.beat.history import DispatchHistory
+from fkcookiecutter.celery_helper.beat.models import (
+    IntervalSchedule, PeriodicTask, PeriodicTaskDispatch, PeriodicTasks, db,
+)
+from fkcookiecutter.celery_helper.beat.schedulers import DatabaseScheduler
+from fkcookiecutter.celery_helper.hooks.schedulers import DatabaseScheduler as HookDatabaseScheduler
+
+
+def test_scheduler_builds_on_empty_database(app_context, celery_app):
+    scheduler = DatabaseScheduler(app=celery_app, lazy=False)
+
+    assert 'celery.backend_cleanup' in scheduler.schedule
+    assert PeriodicTask.query.filter_by(name='celery.backend_cleanup').count() == 1
+
+    # Set up before the base constructor ran `setup_schedule`
+    assert scheduler.change_poll_min_interval <= scheduler._change_poll_interval <= scheduler.change_poll_max_interval
+    assert scheduler.history is None
+    assert scheduler.backpressure is None and scheduler.rate_limiter is None
+
+
+def test_configured_scheduler_builds(app_context, celery_app):
+    scheduler = HookDatabaseScheduler(celery_app, lazy=False)
+
+    assert set(celery_app.conf.beat_schedule) <= set(scheduler.schedule)
+
+
+def add_task(name, every=60, last_run_at=None, **fields):
+    """ An interval task, due unless it ran less than `every` seconds ago """
+    interval = IntervalSchedule(every=every, period=IntervalSchedule.SECONDS)
+    db.session.add(interval)
+    db.session.flush()
+
+    last_run_at = last_run_at or datetime.utcnow() - timedelta(days=1)
+    db.session.add(PeriodicTask(name=name, task="demo." + name, interval_id=interval.id, last_run_at=last_run_at,
+                                args=[], kwargs={}, headers={}, **fields))
+    db.session.commit()
+
+
+@pytest.fixture
+def scheduler(app_context, celery_app, monkeypatch):
+    """ Builds a scheduler of the tasks added so far, `conf` is set first.
+
+    Nothing is published, the entries that would be are in `scheduler.sent`.
+    """
+    def publish(self, entry, producer=None, advance=True, **kwargs):
+        if advance:
+            self.reserve(entry)
+        self.sent.append(entry.name)
+        return SimpleNamespace(id="id-%s-%s" % (entry.name, len(self.sent)))
+
+    monkeypatch.setattr(Scheduler, "apply_async", publish)
+
+    def make(conf=None, **attrs):
+        for key, value in (conf or {}).items():
+            monkeypatch.setitem(celery_app.conf, key, value)
+
+        scheduler = DatabaseScheduler(app=celery_app, lazy=False)
+        scheduler.__dict__.update(dict(producer=None, _priority_ascending=False), **attrs)
+        scheduler.sent = []
+        return scheduler
+    return make
+
+
+@pytest.mark.parametrize("ascending, order", [(False, ["p9", "p1", "none"]), (True, ["p1", "p9", "none"])])
+def test_tick_dispatches_due_entries_by_priority(scheduler, ascending, order):
+    add_task("none")
+    add_task("p1", priority=1)
+    add_task("p9", priority=9)
+    beat = scheduler(_priority_ascending=ascending)
+
+    assert beat.tick() == 0
+    assert beat.sent == order
+
+
+def test_tick_leaves_entries_over_the_budget_for_the_next_tick(scheduler, monkeypatch):
+    for priority in (1, 2, 3):
+        add_task("p%s" % priority, priority=priority)
+    beat = scheduler(tick_budget=0.01)
+    monkeypatch.setattr(beat, "apply_entry", lambda entry, producer=None: (beat.sent.append(entry.name), time.sleep(0.02)))
+
+    assert beat.tick() == 0
+    assert beat.sent == ["p3"]
+    assert {event[2].name for event in beat._heap} >= {"p1", "p2", "p3"}
+
+    beat.tick()
+    beat.tick()
+    assert beat.sent == ["p3", "p2", "p1"]
+
+
+def test_tick_sleeps_until_the_next_entry_is_due(scheduler, monkeypatch):
+    add_task("soon", every=3, last_run_at=datetime.utcnow())
+    beat = scheduler()
+
+    interval = beat.tick()
+    assert beat.sent == []
+    assert 0 < interval <= 3 < beat.max_interval
+
+    # An entry due right now but not yet reported due: the next tick is immediate, not `max_interval` away
+    monkeypatch.setattr(beat, "is_due", lambda entry: schedstate(False, 0))
+    assert beat.tick() == 0
+
+
+def test_entries_are_held_back_while_their_queue_is_over_its_depth_limit(scheduler, monkeypatch):
+    add_task("busy", queue="reports")
+    add_task("other", queue="mail")
+    beat = scheduler(conf={"CELERYBEAT_QUEUE_DEPTH_LIMITS": {"reports": 10}})
+
+    depths = {"reports": 10, "mail": 100}
+    monkeypatch.setattr(beat.backpressure, "refresh", lambda: beat.backpressure.depths.update(depths))
+
+    beat.tick()
+    assert beat.sent == ["other"]
+    assert "busy" in beat._dirty  # advanced anyway, the missed fire is not replayed
+
+    depths["reports"] = 9
+    assert beat.apply_async(beat.schedule["busy"]) is not None
+    assert beat.sent == ["other", "busy"]
+
+
+def test_depth_limits_apply_to_the_resolved_queue(scheduler, monkeypatch, celery_app):
+    add_task("routed")
+    monkeypatch.setitem(celery_app.conf, "task_routes", {"demo.routed": {"queue": "reports"}})
+    beat = scheduler(conf={"CELERYBEAT_QUEUE_DEPTH_LIMITS": {"reports": 10, "demo.routed": 0}})
+    monkeypatch.setattr(beat.backpressure, "refresh", lambda: beat.backpressure.depths.update(reports=3))
+
+    # Only the queue counts, not the task name
+    assert beat.apply_async(beat.schedule["routed"]) is not None
+    assert beat.sent == ["routed"]
+
+
+def test_rate_limited_entries_are_deferred_not_dropped(scheduler, monkeypatch):
+    add_task("first", queue="reports", priority=9)
+    add_task("second", queue="reports", priority=1)
+    beat = scheduler(conf={"CELERYBEAT_RATE_LIMITS": {"reports": "1/m"}})
+
+    beat.tick()
+    assert beat.sent == ["first"]
+    assert "second" in beat.schedule and "second" in beat._dirty
+
+    # A minute later the bucket has a token again
+    clock = time.monotonic() + 60
+    monkeypatch.setattr("kombu.utils.limits.monotonic", lambda: clock)
+
+    assert beat.apply_async(beat.schedule["second"]) is not None
+    assert beat.sent == ["first", "second"]
+
+
+def test_change_poll_backs_off_while_nothing_changes(scheduler, monkeypatch):
+    beat = scheduler(conf={
+        "CELERYBEAT_CHANGE_POLL_MIN_INTERVAL": 5, "CELERYBEAT_CHANGE_POLL_MAX_INTERVAL": 60,
+        "CELERYBEAT_CHANGE_POLL_BACKOFF_FACTOR": 2,
+    })
+    # The first poll sees the default entries the scheduler wrote while starting
+    beat._next_change_poll = 0
+    beat.schedule_changed()
+    beat._change_poll_interval = 5
+
+    polls = []
+    last_change = PeriodicTasks.last_change.__func__
+    monkeypatch.setattr(PeriodicTasks, "last_change", classmethod(lambda cls: polls.append(1) or last_change(cls)))
+
+    intervals = []
+    for _ in range(5):
+        beat._next_change_poll = 0
+        assert not beat.schedule_changed()
+        intervals.append(beat._change_poll_interval)
+    assert intervals == [10, 20, 40, 60, 60]
+
+    # Not polled again before the interval elapsed
+    assert not beat.schedule_changed()
+    assert len(polls) == 5
+
+    PeriodicTasks.bump()
+    db.session.commit()
+
+    beat._next_change_poll = 0
+    assert beat.schedule_changed()
+    assert beat._change_poll_interval == 5
+    assert 0 < beat._next_change_poll - time.monotonic() <= 5
+
+
+def test_dispatches_are_recorded(scheduler, monkeypatch, celery_app):
+    add_task("report", queue="reports")
+    add_task("routed")
+    monkeypatch.setitem(celery_app.conf, "task_routes", {"demo.routed": {"queue": "routed_q"}})
+    beat = scheduler(conf={"CELERYBEAT_DISPATCH_HISTORY": True})
+
+    before = datetime.now()
+    beat.tick()
+    beat.sync()
+    after = datetime.now()
+
+    rows = {row.periodic_task_name: row for row in PeriodicTaskDispatch.query}
+    assert set(rows) == {"report", "routed"}
+    assert (rows["report"].task, rows["report"].queue) == ("demo.report", "reports")
+    assert rows["routed"].queue == "routed_q"
+    assert rows["report"].task_id.startswith("id-report-")
+    assert all(row.status == PeriodicTaskDispatch.SENT for row in rows.values())
+    assert all(before <= row.dispatched_at <= after for row in rows.values())
+
+
+def test_failed_sends_and_history_writes_do_not_break_the_tick(scheduler, monkeypatch):
+    add_task("broken", priority=9)
+    add_task("fine", priority=1)
+    beat = scheduler(conf={"CELERYBEAT_DISPATCH_HISTORY": True, "CELERYBEAT_DISPATCH_HISTORY_BATCH_SIZE": 1})
+
+    publish = Scheduler.apply_async
+
+    def failing_publish(self, entry, *args, **kwargs):
+        if entry.name == "broken":
+            raise ConnectionError("broker is gone")
+        return publish(self, entry, *args, **kwargs)
+
+    monkeypatch.setattr(Scheduler, "apply_async", failing_publish)
+    # Every history write fails too
+    missing = Table("missing_dispatch_table", MetaData(), Column("id", Integer, primary_key=True))
+    monkeypatch.setattr(DispatchHistory, "Model", SimpleNamespace(__table__=missing))
+
+    assert beat.tick() == 0
+    assert beat.sent == ["fine"]
+    # The record of "fine" is kept for the next flush
+    assert len(beat.history) == 1
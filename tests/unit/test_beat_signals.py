@@ -0,0 +1,63 @@
+from fkcookiecutter.celery_helper.beat.models import IntervalSchedule, PeriodicTask, PeriodicTasks, db
+
+
+def add_interval():
+    interval = IntervalSchedule(every=5, period=IntervalSchedule.MINUTES)
+    db.session.add(interval)
+    db.session.flush()
+    return interval
+
+
+def add_task(name, interval):
+    db.session.add(PeriodicTask(name=name, task="demo." + name, interval_id=interval.id, args=[], kwargs={}, headers={}))
+    db.session.flush()
+
+
+def test_one_bump_per_commit_of_many_rows(app_context, bumps):
+    interval = add_interval()
+    for index in range(20):
+        add_task(f"task-{index}", interval)
+    db.session.commit()
+
+    assert len(bumps) == 1
+    assert PeriodicTasks.last_change() is not None
+
+    # The next transaction bumps again
+    PeriodicTask.query.filter_by(name="task-0").one().enabled = False
+    db.session.commit()
+    assert len(bumps) == 2
+
+
+def test_rolled_back_savepoint_bumps_again(app_context, bumps):
+    interval = add_interval()
+    db.session.commit()
+    del bumps[:]
+
+    savepoint = db.session.begin_nested()
+    add_task("rolled-back", interval)
+    savepoint.rollback()
+    assert len(bumps) == 1
+
+    # The bump went away with the savepoint, the next change of the transaction bumps again
+    add_task("kept", interval)
+    add_task("kept-too", interval)
+    db.session.commit()
+
+    assert len(bumps) == 2
+    assert PeriodicTasks.last_change() is not None
+    assert {task.name for task in PeriodicTask.query} == {"kept", "kept-too"}
+
+
+def test_no_bump_survives_a_rollback(app_context, bumps):
+    interval = add_interval()
+    db.session.commit()
+    last_change = PeriodicTasks.last_change()
+
+    add_task("rolled-back", interval)
+    db.session.rollback()
+    assert PeriodicTasks.last_change() == last_change
+
+    # The rolled back transaction does not count as bumped either
+    add_task("next", interval)
+    db.session.commit()
+    assert PeriodicTasks.last_change() != last_change
@@ -0,0 +1,101 @@
+import pytest
+
+TOKEN = "test-beat-token"
+
+
+@pytest.fixture
+def client(app_context):
+    app_context.config["BEAT_API_TOKEN"] = TOKEN
+    yield app_context.test_client()
+    app_context.config["BEAT_API_TOKEN"] = None
+
+
+def auth(token=TOKEN):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def create(client, tasks):
+    return client.post("/beat/tasks/bulk/create", json={"tasks": tasks}, headers=auth())
+
+
+def test_api_requires_token(client):
+    assert client.get("/beat/tasks").status_code == 401
+    assert client.get("/beat/tasks", headers=auth("wrong")).status_code == 401
+    assert client.post("/beat/tasks/bulk/create", json={"tasks": [{}]}).status_code == 401
+    assert client.get("/beat/tasks", headers=auth()).status_code == 200
+
+
+def test_api_disabled_without_token(app_context):
+    client = app_context.test_client()
+    assert client.get("/beat/tasks", headers=auth()).status_code == 403
+
+
+def test_bulk_create_rejects_items_that_are_not_objects(client):
+    response = create(client, [5, "crontab", {"name": "ok", "task": "demo.ok", "crontab": "*/5 * * * *"}])
+
+    assert response.status_code == 200
+    assert response.json["succeeded"] == 1
+    assert [result["ok"] for result in response.json["results"]] == [False, False, True]
+    assert response.json["results"][0]["error"] == "Each task must be an object"
+
+
+def test_schedule_created_by_a_failed_item_is_not_reused(client):
+    from fkcookiecutter.celery_helper.beat.models import CrontabSchedule, PeriodicTask, db
+
+    response = create(client, [
+        # Resolves (creates) the crontab, then fails validation: its savepoint is rolled back
+        {"name": "bad", "task": "demo.bad", "crontab": "0 3 * * *", "expires": "2030-01-01T00:00:00",
+         "expire_seconds": 10},
+        {"name": "good", "task": "demo.good", "crontab": "0 3 * * *"},
+    ])
+
+    assert [result["ok"] for result in response.json["results"]] == [False, True]
+    task = PeriodicTask.query.filter_by(name="good").one()
+    assert db.session.get(CrontabSchedule, task.crontab_id).hour == "3"
+
+
+def list_pages(client, **args):
+    """ Names of every page of `/beat/tasks`, following `next_after_id` """
+    pages, after_id = [], None
+    while True:
+        query = dict(args, **({"after_id": after_id} if after_id is not None else {}))
+        body = client.get("/beat/tasks", query_string=query, headers=auth()).json
+        pages.append([task["name"] for task in body["tasks"]])
+
+        after_id = body["next_after_id"]
+        if after_id is None:
+            return pages
+
+
+def test_list_pages_have_no_duplicates_or_gaps(client):
+    create(client, [{"name": "task-%s" % index, "task": "demo.task", "crontab": "*/5 * * * *"} for index in range(7)])
+
+    pages = list_pages(client, limit=3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == ["task-%s" % index for index in range(7)]
+
+    # Tasks created between two pages come after the cursor, the pages already read do not move
+    first = client.get("/beat/tasks", query_string={"limit": 3}, headers=auth()).json
+    create(client, [{"name": "late", "task": "demo.task", "crontab": "*/5 * * * *"}])
+    rest = list_pages(client, limit=3, after_id=first["next_after_id"])
+    assert [task["name"] for task in first["tasks"]] + sum(rest, []) == ["task-%s" % index for index in range(7)] + ["late"]
+
+
+def test_list_etag_follows_the_schedule_changes(client):
+    create(client, [{"name": "etag", "task": "demo.etag", "crontab": "*/5 * * * *"}])
+
+    response = client.get("/beat/tasks", headers=auth())
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+
+    cached = client.get("/beat/tasks", headers=dict(auth(), **{"If-None-Match": etag}))
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+
+    updated = client.post("/beat/tasks/bulk/update", json={"tasks": [{"name": "etag", "crontab": "*/10 * * * *"}]},
+                          headers=auth())
+    assert updated.json["succeeded"] == 1
+
+    changed = client.get("/beat/tasks", headers=dict(auth(), **{"If-None-Match": etag}))
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
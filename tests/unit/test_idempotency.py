@@ -0,0 +1,132 @@
+import time
+
+import fakeredis
+import pytest
+import redis
+from celery import states
+
+from fkcookiecutter.celery_helper.conf import CeleryConfig
+from fkcookiecutter.celery_helper.core.backends import ResultPolicyCelery
+from fkcookiecutter.celery_helper.core.idempotency import IdempotencyGuard
+from fkcookiecutter.celery_helper.hooks import context
+from fkcookiecutter.celery_helper.hooks.context import TaskContext
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """ Every guard talks to one fake Redis server """
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+
+    monkeypatch.setattr(redis.Redis, "from_url", classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server)))
+    monkeypatch.setattr(context.idempotency_guard, "_client", None)
+    return client
+
+
+@pytest.fixture
+def task():
+    app = ResultPolicyCelery(main="tests", task_cls=TaskContext)
+    app.config_from_object(CeleryConfig)
+    app.conf.result_backend = "cache+memory://"
+    runs = []
+
+    @app.task(name="tests.charge", idempotent=True)
+    def charge(order_id, **kwargs):
+        runs.append(order_id)
+        return order_id
+
+    charge.runs = runs
+    return charge
+
+
+def key_of(task, *args):
+    return context.idempotency_guard.key_for(task.name, args, {})
+
+
+def test_duplicate_is_ignored(fake_redis, task):
+    assert context.idempotency_guard.acquire(key_of(task, 42), "running-task-id")
+
+    result = task.apply((42,))
+
+    assert result.state == states.IGNORED
+    assert task.runs == []
+
+
+def test_success_is_kept_for_ttl(fake_redis, task):
+    first = task.apply((42,))
+    assert first.state == states.SUCCESS
+    assert fake_redis.get(key_of(task, 42)) == ("done:%s" % first.id).encode()
+    assert 0 < fake_redis.ttl(key_of(task, 42)) <= context.idempotency_guard.ttl
+
+    assert task.apply((42,)).state == states.IGNORED
+    assert task.apply((43,)).state == states.SUCCESS
+    assert task.runs == [42, 43]
+
+
+def test_redelivered_message_takes_over_its_lease(fake_redis):
+    guard = IdempotencyGuard("redis://fake", lease_ttl=60)
+    key = guard.key_for("tests.charge", (42,), {})
+
+    # The worker running "task-abc" died, the broker redelivers the message with the same task id
+    assert guard.acquire(key, "task-abc")
+    assert guard.acquire(key, "task-abc")
+    assert 0 < fake_redis.ttl(key) <= 60
+
+    guard.done(key, "task-abc")
+    assert not guard.acquire(key, "task-abc")
+
+
+def test_lease_expires_for_other_executions(fake_redis):
+    guard = IdempotencyGuard("redis://fake", lease_ttl=1)
+    key = guard.key_for("tests.charge", (42,), {})
+
+    assert guard.acquire(key, "task-abc")
+    assert not guard.acquire(key, "task-def")
+
+    time.sleep(1.1)
+    assert guard.acquire(key, "task-def")
+
+
+def test_redelivered_task_runs(fake_redis, task):
+    # Lease of a worker that died running the same message
+    assert context.idempotency_guard.acquire(key_of(task, 42), "task-abc")
+
+    result = task.apply((42,), task_id="task-abc")
+
+    assert result.state == states.SUCCESS
+    assert task.runs == [42]
+
+
+def test_retry_releases_the_lease(fake_redis, task):
+    task.push_request(id="task-id", called_directly=False)
+    try:
+        task._acquire_idempotency((42,), {})
+        assert fake_redis.get(key_of(task, 42)) == b"task-id"
+
+        task.on_retry(ValueError(), "task-id", (42,), {}, None)
+    finally:
+        task.pop_request()
+
+    assert fake_redis.get(key_of(task, 42)) is None
+    assert context.idempotency_guard.acquire(key_of(task, 42), "retried-task-id")
+
+
+def test_release_keeps_the_lease_of_another_execution(fake_redis):
+    guard = IdempotencyGuard("redis://fake")
+    key = guard.key_for("tests.charge", (42,), {})
+
+    assert guard.acquire(key, "other-task-id")
+    guard.release(key, "task-id")
+    guard.done(key, "task-id")
+
+    assert fake_redis.get(key) == b"other-task-id"
+
+
+def test_fails_open_when_redis_is_down():
+    guard = IdempotencyGuard("redis://127.0.0.1:1/0")
+    key = guard.key_for("tests.charge", (42,), {})
+
+    assert guard.acquire(key, "task-id")
+    assert guard.acquire(key, "task-id")
+    guard.done(key, "task-id")
+    guard.release(key, "task-id")
@@ -0,0 +1,38 @@
+import importlib.util
+import os
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import create_engine, inspect
+
+from fkcookiecutter.celery_helper.beat.models import PeriodicTaskDispatch
+
+VERSIONS = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "migrations", "versions")
+
+
+def load_migration(revision):
+    spec = importlib.util.spec_from_file_location(revision, os.path.join(VERSIONS, "%s_.py" % revision))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_dispatch_history_migration_matches_the_model():
+    migration = load_migration("5b0c8e2f4a1d")
+    table = PeriodicTaskDispatch.__table__
+
+    with create_engine("sqlite://").begin() as connection:
+        with Operations.context(MigrationContext.configure(connection)):
+            migration.upgrade()
+
+        inspector = inspect(connection)
+        assert {column["name"]: column["nullable"] for column in inspector.get_columns(table.name)} == {
+            column.name: column.nullable for column in table.columns
+        }
+        assert {tuple(index["column_names"]) for index in inspector.get_indexes(table.name)} == {
+            tuple(column.name for column in index.columns) for index in table.indexes
+        }
+
+        with Operations.context(MigrationContext.configure(connection)):
+            migration.downgrade()
+        assert table.name not in inspect(connection).get_table_names()
@@ -0,0 +1,26 @@
+from fkcookiecutter.celery_helper.core.backends import ResultPolicyCelery
+from fkcookiecutter.celery_helper.core.retry import RetryPolicy
+from fkcookiecutter.celery_helper.hooks.context import TaskContext
+
+
+def test_retry_queue_without_a_queue_option():
+    app = ResultPolicyCelery(main="tests", task_cls=TaskContext)
+
+    @app.task(name="tests.charge")
+    def charge(order_id, **kwargs):
+        return order_id
+
+    charge.push_request(id="task-id", delivery_info={"routing_key": "orders"})
+    try:
+        assert charge._retry_queue() == "orders"
+    finally:
+        charge.pop_request()
+
+
+def test_retry_budget_per_queue():
+    policy = RetryPolicy(budgets={"orders": ("1/m", 2)})
+
+    assert policy.acquire("tests.charge", "orders")
+    assert policy.acquire("tests.charge", "orders")
+    assert not policy.acquire("tests.charge", "orders")
+    assert policy.acquire("tests.charge", "default")
@@ -0,0 +1,137 @@
+from collections import defaultdict
+
+import pytest
+from amqp.exceptions import MessageNacked
+from celery.result import AsyncResult
+
+from fkcookiecutter.celery_helper.core.backends import ResultPolicyCelery
+from fkcookiecutter.celery_helper.core.confirms import ChunkConfirms
+from fkcookiecutter.celery_helper.hooks.context import TaskContext
+
+
+class FakeConnection:
+    def __init__(self):
+        self.frames = []
+        self.drains = 0
+
+    def drain_events(self, timeout=None):
+        self.drains += 1
+        self.frames.pop(0)()
+
+
+class FakeChannel:
+    """ The parts of a py-amqp channel used by `ChunkConfirms`, the broker acks on the next drain """
+
+    def __init__(self, nack=()):
+        self.connection = FakeConnection()
+        self.events = defaultdict(set)
+        self.confirm_selected = False
+        self.nack = nack
+
+    def confirm_select(self):
+        self.confirm_selected = True
+
+    def ack_all(self, published):
+        event = "basic_nack" if published in self.nack else "basic_ack"
+        self.connection.frames.append(lambda: [callback(published, True) for callback in self.events[event]])
+
+
+def test_chunk_confirms_wait_once_per_chunk():
+    channel = FakeChannel()
+    confirms = ChunkConfirms(channel)
+    assert channel.confirm_selected
+
+    for _ in range(100):
+        confirms.published()
+    channel.ack_all(100)
+    confirms.wait()
+
+    assert channel.connection.drains == 1
+
+
+def test_chunk_confirms_raise_on_nack():
+    channel = FakeChannel(nack=(3,))
+    confirms = ChunkConfirms(channel)
+
+    for _ in range(3):
+        confirms.published()
+    channel.ack_all(3)
+
+    with pytest.raises(MessageNacked):
+        confirms.wait()
+
+
+def test_chunk_confirms_connection_needs_confirm_publish_on_amqp():
+    app = ResultPolicyCelery(main="tests", broker="amqp://guest@localhost//")
+    assert ChunkConfirms.connection_for(app) is None
+
+    app.conf.broker_transport_options = {"confirm_publish": True, "confirm_timeout": 5}
+    connection = ChunkConfirms.connection_for(app)
+    # Its channels publish without waiting for each ack
+    assert connection.transport_options == {"confirm_publish": False, "confirm_timeout": 5}
+    connection.release()
+
+    memory = ResultPolicyCelery(main="tests", broker="memory://")
+    memory.conf.broker_transport_options = {"confirm_publish": True}
+    assert ChunkConfirms.connection_for(memory) is None
+
+
+def test_send_many_publishes_every_item():
+    app = ResultPolicyCelery(main="tests", task_cls=TaskContext, broker="memory://")
+
+    @app.task(name="tests.echo")
+    def echo(value):
+        return value
+
+    ids = echo.send_many([(index,) for index in range(5)] + [{"value": 5}], chunk_size=2)
+    assert len(set(ids)) == 6
+
+    with app.connection_for_read() as connection:
+        queue = connection.SimpleQueue("celery")
+        messages = [queue.get(timeout=1) for _ in ids]
+        queue.close()
+
+    assert [message.headers["id"] for message in messages] == ids
+    assert [message.payload[0] for message in messages[:5]] == [[index] for index in range(5)]
+    assert messages[5].payload[1] == {"value": 5}
+
+
+def test_send_many_makes_results_only_when_asked(monkeypatch):
+    app = ResultPolicyCelery(main="tests", task_cls=TaskContext, broker="memory://", backend="cache+memory://")
+
+    @app.task(name="tests.echo")
+    def echo(value):
+        return value
+
+    calls = []
+    monkeypatch.setattr(type(echo.backend), "on_task_call", lambda self, producer, task_id: calls.append(task_id))
+
+    ids = echo.send_many([(index,) for index in range(3)])
+    assert all(isinstance(task_id, str) for task_id in ids)
+    assert calls == []
+
+    results = echo.send_many([(index,) for index in range(3)], results=True)
+    assert [result.id for result in results] == calls
+    assert all(isinstance(result, AsyncResult) for result in results)
+
+
+def test_send_many_messages_match_apply_async():
+    app = ResultPolicyCelery(main="tests", task_cls=TaskContext, broker="memory://")
+
+    @app.task(name="tests.echo")
+    def echo(value):
+        return value
+
+    options = dict(countdown=10, expires=60, queue="bulk_q", headers={"tenant": 1})
+    echo.apply_async((1,), **options)
+    echo.send_many([(2,)], **options)
+
+    with app.connection_for_read() as connection:
+        queue = connection.SimpleQueue("bulk_q")
+        single, bulk = queue.get(timeout=1), queue.get(timeout=1)
+        queue.close()
+
+    assert set(single.headers) == set(bulk.headers)
+    assert bulk.headers["tenant"] == 1 and bulk.headers["eta"] and bulk.headers["expires"]
+    assert bulk.properties["expiration"] == single.properties["expiration"]
+    assert bulk.delivery_info == single.delivery_info
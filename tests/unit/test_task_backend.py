@@ -0,0 +1,68 @@
+import os
+import threading
+
+import pytest
+from celery import states
+
+from fkcookiecutter.celery_helper.core.backends import ResultPolicyCelery
+from fkcookiecutter.celery_helper.core.exceptions import ResultTooLarge
+from fkcookiecutter.celery_helper.core.results import RESULT_POLICY_KEY, ResultPolicyBackendMixin
+from fkcookiecutter.celery_helper.hooks.context import TaskContext
+
+
+class Request:
+    task = "tests.echo"
+    ignore_result = False
+
+
+def make_app():
+    app = ResultPolicyCelery(main="tests", task_cls=TaskContext, backend="cache+memory://")
+
+    @app.task(name="tests.echo", result_compress_threshold=10, result_max_size=64)
+    def echo(value):
+        return value
+
+    return app, echo
+
+
+def test_default_backend_is_the_thread_local_app_backend(celery_app):
+    task = celery_app.tasks["fkcookiecutter.celery_helper.app.debug_task"]
+    assert task.backend is celery_app.backend
+    assert isinstance(task.backend, ResultPolicyBackendMixin)
+
+    backends = []
+    thread = threading.Thread(target=lambda: backends.append(task.backend))
+    thread.start()
+    thread.join()
+
+    assert backends[0] is not celery_app.backend
+    assert isinstance(backends[0], ResultPolicyBackendMixin)
+
+
+def test_default_backend_applies_the_result_policy():
+    app, echo = make_app()
+    value = "x" * 1000
+
+    echo.backend.store_result("task-1", value, states.SUCCESS, request=Request())
+    stored = echo.backend.get(echo.backend.get_key_for_task("task-1"))
+
+    assert RESULT_POLICY_KEY in stored
+    assert len(stored) < len(value)
+    assert app.AsyncResult("task-1").get(timeout=1) == value
+
+
+
+def test_results_over_the_max_size_are_stored_as_failures():
+    app, echo = make_app()
+
+    echo.backend.store_result("task-2", os.urandom(1000).hex(), states.SUCCESS, request=Request())
+    result = app.AsyncResult("task-2")
+
+    assert result.state == states.FAILURE
+    with pytest.raises(ResultTooLarge):
+        result.get(timeout=1)
+
+
+def test_results_have_no_max_size_by_default(celery_app):
+    task = celery_app.tasks["fkcookiecutter.celery_helper.app.debug_task"]
+    assert task.backend.result_policy(task.name).max_size is None